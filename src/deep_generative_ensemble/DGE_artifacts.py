@@ -0,0 +1,261 @@
+# stdlib
+import os
+import pickle
+import struct
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from deep_generative_ensemble import DGE_serialization
+from deep_generative_ensemble.DGE_profiling import profile_stage, profiled
+
+# Bundle layout: MAGIC, the offset of the index (uint64), the serialized members one
+# after another, and finally the pickled index {key: (offset, length)}. Members are
+# serialized with the codec of DGE_serialization. New members are appended after the
+# index, followed by a new index, and the offset in the header is only updated once
+# that is written, so a bundle stays readable if writing it is interrupted.
+MAGIC = b"DGEBUNDLE1\n"
+HEADER_SIZE = len(MAGIC) + 8
+
+# Members a ModelStore loads ahead of get, and serializes and writes behind put, on
+# background threads. At most this many are in flight, 0 does all I/O in the calling
+# thread.
+IO_DEPTH = int(os.environ.get("DGE_IO_DEPTH", 2))
+
+
+class Bundle:
+    """Read access to a bundle written by ModelStore.
+
+    Only the index is read when the bundle is opened. Members are unpickled lazily on
+    access, or all at once with load_all, which reads the file sequentially.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        # members may be read from background threads, see ModelStore.prefetch
+        self.lock = threading.Lock()
+        self.file = open(path, "rb")
+        try:
+            header = self.file.read(HEADER_SIZE)
+            if not header.startswith(MAGIC):
+                raise ValueError(f"{path} is not a model bundle")
+            (index_offset,) = struct.unpack("<Q", header[len(MAGIC) :])
+            self.file.seek(index_offset)
+            self.index = pickle.load(self.file)
+        except BaseException:
+            self.file.close()
+            raise
+        DGE_serialization.touch(path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self.file.close()
+
+    def __contains__(self, key):
+        return key in self.index
+
+    def __len__(self):
+        return len(self.index)
+
+    def keys(self):
+        return self.index.keys()
+
+    def raw(self, key):
+        """Serialized bytes of a member"""
+        offset, length = self.index[key]
+        with self.lock:
+            self.file.seek(offset)
+            return self.file.read(length)
+
+    def __getitem__(self, key):
+        start = time.perf_counter()
+        with profile_stage("serialization.load"):
+            data = self.raw(key)
+            member = DGE_serialization.loads(data)
+        DGE_serialization.record(
+            f"{self.path}[{key}]", "load", "bundle", len(data), start
+        )
+        return member
+
+    def load_all(self):
+        with self.lock:
+            self.file.seek(0)
+            data = self.file.read()
+        return {
+            key: DGE_serialization.loads(data[offset : offset + length])
+            for key, (offset, length) in self.index.items()
+        }
+
+
+class ModelStore:
+    """The cached members of one (experiment, run), kept in a single bundle file.
+
+    Members missing from the bundle are looked up in the legacy one-pickle-per-member
+    files, named legacy_filename(key), so existing workspaces keep working. New
+    members are added with put and become part of the bundle with flush.
+
+    I/O overlaps with compute: prefetch loads the next members on a background thread
+    while the current one is used, and put serializes new members and appends them to
+    the bundle file in the background (write-behind), so flush only writes the index.
+    The bytes of a member are dropped once they are written, and at most depth members
+    are in flight either way, which bounds the memory I/O takes independently of the
+    number of members. Members that are put again leave their old bytes in the file.
+    """
+
+    def __init__(self, path, legacy_filename=None, depth=IO_DEPTH):
+        self.path = path
+        self.legacy_filename = legacy_filename
+        self.bundle = Bundle(path) if os.path.exists(path) else None
+        self.new = {}
+        self.depth = depth
+        self.executor = None
+        # key -> future of the member, loaded ahead of get
+        self.prefetched = {}
+        self.ahead = deque()
+        # futures of the members being serialized and appended
+        self.writing = deque()
+        # the file new members are appended to, and the index of the bundle with them
+        self.file = None
+        self.index = None
+        self.lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+            self.executor = None
+        self.prefetched = {}
+        self.ahead.clear()
+        self.writing.clear()
+        if self.file is not None:
+            # members that were not flushed are not part of the bundle
+            self.file.close()
+            if self.file.name != self.path:
+                os.remove(self.file.name)
+            self.file = None
+        if self.bundle is not None:
+            self.bundle.close()
+            self.bundle = None
+
+    def _executor(self):
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(
+                max_workers=DGE_serialization.N_JOBS, thread_name_prefix="ModelStore"
+            )
+        return self.executor
+
+    def prefetch(self, keys):
+        """Load the members of keys, in this order, in the background ahead of get"""
+        if self.depth <= 0:
+            return
+        self.ahead.extend(key for key in keys if key not in self.prefetched)
+        self._fill()
+
+    def _fill(self):
+        while self.ahead and len(self.prefetched) < self.depth:
+            key = self.ahead.popleft()
+            self.prefetched[key] = self._executor().submit(self._load, key)
+
+    def get(self, key):
+        """The stored member, or None if there is none"""
+        if key in self.new:
+            return self.new[key]
+        future = self.prefetched.pop(key, None)
+        if future is not None:
+            self._fill()
+            return future.result()
+        return self._load(key)
+
+    def _load(self, key):
+        if self.bundle is not None and key in self.bundle:
+            return self.bundle[key]
+        if self.legacy_filename is not None:
+            filename = self.legacy_filename(key)
+            if os.path.exists(filename):
+                return DGE_serialization.load(filename)
+        return None
+
+    def put(self, key, model):
+        self.new[key] = model
+        if self.depth <= 0:
+            self._write(key, model)
+            return
+        # write-behind, waiting for the oldest member if depth are in flight
+        while len(self.writing) >= self.depth:
+            self.writing.popleft().result()
+        self.writing.append(self._executor().submit(self._write, key, model))
+
+    def _write(self, key, model):
+        start = time.perf_counter()
+        codec = DGE_serialization.bytes_codec()
+        data = DGE_serialization.dumps(model, codec)
+        DGE_serialization.record(f"{self.path}[{key}]", "dump", codec, len(data), start)
+        with self.lock:
+            if self.file is None:
+                self._open()
+            self.index[key] = (self.file.tell(), len(data))
+            self.file.write(data)
+
+    def _open(self):
+        if self.bundle is None:
+            # a new bundle is written to a temporary file, which flush moves into place
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self.file = open(f"{self.path}.tmp{os.getpid()}", "w+b")
+            self.file.write(MAGIC + struct.pack("<Q", 0))
+            self.index = {}
+        else:
+            # members are appended after the index of the bundle, see MAGIC
+            self.file = open(self.path, "r+b")
+            self.file.seek(0, os.SEEK_END)
+            self.index = dict(self.bundle.index)
+
+    @profiled("serialization.flush")
+    def flush(self):
+        """Write the index of the bundle if new members were added"""
+        if len(self.new) == 0:
+            return
+
+        while self.writing:
+            self.writing.popleft().result()
+        # prefetches read from the bundle that is reopened below
+        for future in self.prefetched.values():
+            future.exception()
+
+        index_offset = self.file.tell()
+        pickle.dump(self.index, self.file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.file.seek(len(MAGIC))
+        self.file.write(struct.pack("<Q", index_offset))
+        self.file.close()
+
+        if self.bundle is not None:
+            self.bundle.close()
+        if self.file.name != self.path:
+            os.replace(self.file.name, self.path)
+        self.file = None
+        self.index = None
+        self.bundle = Bundle(self.path)
+        self.new = {}
+
+
+# The members of a fused model type (see DGE_utils.FUSED_MODEL_TYPES) share one set of
+# parameters, so they are stored together under a single key.
+FUSED_KEY = "members"
+
+
+def fused_store(fileroot):
+    """The ModelStore of the fused members cached under fileroot. The fused pickles
+    <fileroot>_fused.pkl of earlier versions are read too"""
+    return ModelStore(
+        f"{fileroot}_fused.dge", legacy_filename=lambda key: f"{fileroot}_fused.pkl"
+    )
@@ -0,0 +1,298 @@
+# stdlib
+import itertools
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from functools import partial
+
+from deep_generative_ensemble.DGE_data import load_real_data
+from deep_generative_ensemble.DGE_experiments import cross_val
+from deep_generative_ensemble.DGE_utils import (
+    accuracy_confidence_curve,
+    aggregate,
+    aggregate_predictive,
+    cat_dl,
+    compute_metrics,
+    supervised_task,
+)
+
+# third party
+import numpy as np
+import pandas as pd
+
+BENCHMARK_DATASETS = ["moons", "circles", "gaussian"]
+APPROACHES = ["Oracle", "Naive", "DGE"]
+
+# modules that should only be imported on first use, and the import time budget (s) of
+# the modules that pool workers import
+HEAVY_MODULES = ["matplotlib", "mpl_toolkits", "synthcity", "torch", "xgboost"]
+IMPORT_BUDGETS = {
+    "deep_generative_ensemble.DGE_utils": 2.0,
+    "deep_generative_ensemble.DGE_data": 2.0,
+    "deep_generative_ensemble.DGE_experiments": 2.5,
+    "deep_generative_ensemble.DGE_serialization": 1.5,
+}
+
+
+class GaussianGenerator:
+    """Cheap stand-in for a synthcity generator: one Gaussian per class"""
+
+    def __init__(self, random_state=0):
+        self.random_state = random_state
+
+    def fit(self, X):
+        df = X.dataframe()
+        y = df["target"].values
+        features = df.drop(columns="target")
+        self.columns = features.columns
+        self.classes, counts = np.unique(y, return_counts=True)
+        self.prior = counts / counts.sum()
+        self.params = []
+        for c in self.classes:
+            x = features.values[y == c].astype(float)
+            cov = np.atleast_2d(np.cov(x, rowvar=False)) + 1e-6 * np.eye(x.shape[1])
+            self.params.append((x.mean(axis=0), cov))
+        return self
+
+    def generate(self, count):
+        rng = np.random.default_rng(self.random_state)
+        labels = rng.choice(len(self.classes), size=count, p=self.prior)
+        X = np.empty((count, len(self.columns)))
+        for j, (mean, cov) in enumerate(self.params):
+            rows = labels == j
+            X[rows] = rng.multivariate_normal(mean, cov, size=rows.sum())
+        X = pd.DataFrame(X, columns=self.columns)
+        X["target"] = self.classes[labels]
+        return X
+
+
+def benchmark_inputs(dataset, n, K, d=2, p_train=0.8, seed=0):
+    """Real data with n training rows and d features (the dataset's features padded with
+    noise), and K stub synthetic datasets of n rows each"""
+    # synthcity absolute
+    from synthcity.plugins.core.dataloader import GenericDataLoader
+
+    X_gt = load_real_data(dataset)
+    X = X_gt.dataframe().iloc[: int(n / p_train)].reset_index(drop=True)
+    rng = np.random.default_rng(seed)
+    n_features = X.shape[1] - 1
+    for j in range(n_features, d):
+        X.insert(j, j, rng.standard_normal(len(X)))
+    X_gt = GenericDataLoader(X, target_column="target", train_size=p_train)
+    X_gt.targettype = "classification"
+
+    X_syns = []
+    for k in range(K):
+        X_syn = GaussianGenerator(seed + k).fit(X_gt.train()).generate(n)
+        X_syn = GenericDataLoader(X_syn, target_column="target")
+        X_syn.targettype = X_gt.targettype
+        X_syns.append(X_syn)
+    return X_gt, X_syns
+
+
+def measure(func, n_repeats=3):
+    """Best wall time over n_repeats, and the peak traced memory of one extra call"""
+    times = []
+    for _ in range(n_repeats):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return min(times), peak / 2**20
+
+
+def benchmark_cases(X_gt, X_syns, model_type, workspace_folder):
+    """The benchmarked calls on X_gt and X_syns, by benchmark name"""
+    X_test = X_gt.test()
+    X_test.targettype = X_gt.targettype
+    y_true = X_test.unpack(as_numpy=True)[1]
+    y_prob = np.random.default_rng(0).uniform(size=len(y_true))
+    common = dict(task_type=model_type, load=False, save=False)
+
+    cases = {
+        "compute_metrics": partial(compute_metrics, y_true, y_prob),
+        "accuracy_confidence_curve": partial(accuracy_confidence_curve, y_true, y_prob),
+        "cat_dl": partial(cat_dl, X_syns),
+        "aggregate": partial(
+            aggregate,
+            X_test,
+            X_syns,
+            supervised_task,
+            workspace_folder=workspace_folder,
+            **common,
+        ),
+    }
+    for approach in APPROACHES:
+        cases[f"aggregate_predictive[{approach}]"] = partial(
+            aggregate_predictive,
+            X_gt,
+            X_syns,
+            workspace_folder=workspace_folder,
+            approach=approach,
+            **common,
+        )
+    # cross_val evaluates runs of 20 synthetic datasets
+    if len(X_syns) >= 20:
+        cases["cross_val"] = partial(
+            cross_val,
+            X_gt,
+            X_syns,
+            workspace_folder=workspace_folder,
+            task_type=model_type,
+            load=False,
+            save=False,
+        )
+    return cases
+
+
+def run_benchmarks(
+    datasets=BENCHMARK_DATASETS,
+    ns=(500, 2000),
+    Ks=(5, 20),
+    ds=(2, 10),
+    model_type="lr",
+    n_repeats=3,
+    verbose=False,
+):
+    """Time the DGE hot paths on small inputs with a stub generator.
+
+    Every benchmark runs for all combinations of dataset, n (training rows per
+    dataset), K (number of synthetic datasets) and d (number of features), so the
+    results also give scaling curves.
+
+    Returns:
+        pd.DataFrame with the best wall time (s), rows per second (n * K / seconds)
+        and peak traced memory (MB) per benchmark and size
+    """
+    results = []
+    with tempfile.TemporaryDirectory() as workspace_folder:
+        for dataset, n, K, d in itertools.product(datasets, ns, Ks, ds):
+            X_gt, X_syns = benchmark_inputs(dataset, n, K, d)
+            cases = benchmark_cases(X_gt, X_syns, model_type, workspace_folder)
+            for name, func in cases.items():
+                seconds, peak_mb = measure(func, n_repeats)
+                if verbose:
+                    print(f"{name} {dataset} n={n} K={K} d={d}: {seconds:.4f}s")
+                results.append(
+                    {
+                        "benchmark": name,
+                        "dataset": dataset,
+                        "n": n,
+                        "K": K,
+                        "d": d,
+                        "seconds": seconds,
+                        "rows_per_s": n * K / seconds,
+                        "peak_mb": peak_mb,
+                    }
+                )
+    return pd.DataFrame(results)
+
+
+def import_time(module, n_repeats=3):
+    """Best time (s) to import module in a fresh interpreter, and the heavy modules
+    that importing it pulled in"""
+    code = (
+        "import json, sys, time\n"
+        "start = time.perf_counter()\n"
+        f"import {module}\n"
+        "seconds = time.perf_counter() - start\n"
+        f"heavy = [m for m in {HEAVY_MODULES!r} if m in sys.modules]\n"
+        "print(json.dumps({'seconds': seconds, 'heavy': heavy}))"
+    )
+    runs = []
+    for _ in range(n_repeats):
+        out = subprocess.run(
+            [sys.executable, "-c", code], capture_output=True, text=True, check=True
+        )
+        runs.append(json.loads(out.stdout.strip().splitlines()[-1]))
+    return min(run["seconds"] for run in runs), runs[0]["heavy"]
+
+
+def check_import_budget(budgets=None, n_repeats=3):
+    """Raise a ValueError if importing any module takes longer than its budget, or
+    imports plotting, synthcity, torch or xgboost"""
+    budgets = budgets or IMPORT_BUDGETS
+    rows = []
+    for module, budget in budgets.items():
+        seconds, heavy = import_time(module, n_repeats)
+        rows.append(
+            {"module": module, "seconds": seconds, "budget": budget, "heavy": heavy}
+        )
+    results = pd.DataFrame(rows)
+
+    heavy = results["heavy"].map(len) > 0
+    over = results[(results["seconds"] > results["budget"]) | heavy]
+    if len(over) > 0:
+        raise ValueError(f"Import time budget exceeded:\n{over.to_string()}")
+    return results
+
+
+KEY = ["benchmark", "dataset", "n", "K", "d"]
+
+
+def save_baseline(results, path):
+    with open(path, "w") as f:
+        json.dump(results.to_dict(orient="records"), f, indent=1)
+
+
+def compare_to_baseline(results, path, time_tolerance=0.2, memory_tolerance=0.2):
+    """Compare results to a baseline saved by save_baseline.
+
+    A benchmark regressed if it is more than time_tolerance slower, or uses more than
+    memory_tolerance more memory, than the baseline.
+    """
+    with open(path) as f:
+        baseline = pd.DataFrame(json.load(f))
+
+    merged = results.merge(baseline, on=KEY, suffixes=("", "_baseline"))
+    merged["time_ratio"] = merged["seconds"] / merged["seconds_baseline"]
+    merged["memory_ratio"] = merged["peak_mb"] / merged["peak_mb_baseline"]
+    merged["regressed"] = (merged["time_ratio"] > 1 + time_tolerance) | (
+        merged["memory_ratio"] > 1 + memory_tolerance
+    )
+    return merged[
+        KEY + ["seconds", "seconds_baseline", "time_ratio", "memory_ratio", "regressed"]
+    ]
+
+
+if __name__ == "__main__":
+    # stdlib
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark the DGE hot paths")
+    parser.add_argument("--baseline", default="benchmarks_baseline.json")
+    parser.add_argument(
+        "--save-baseline", action="store_true", help="store results as the baseline"
+    )
+    parser.add_argument("--quick", action="store_true", help="smallest sizes only")
+    parser.add_argument("--model-type", default="lr")
+    parser.add_argument(
+        "--imports", action="store_true", help="only check the import time budgets"
+    )
+    args = parser.parse_args()
+
+    print(check_import_budget().to_string())
+    if args.imports:
+        sys.exit(0)
+
+    kwargs = dict(ns=(500,), Ks=(5,), ds=(2,)) if args.quick else {}
+    results = run_benchmarks(model_type=args.model_type, verbose=True, **kwargs)
+    print(results.to_string())
+
+    if args.save_baseline:
+        save_baseline(results, args.baseline)
+    elif os.path.exists(args.baseline):
+        comparison = compare_to_baseline(results, args.baseline)
+        print(comparison.to_string())
+        if comparison["regressed"].any():
+            sys.exit(1)
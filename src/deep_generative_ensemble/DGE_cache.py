@@ -0,0 +1,305 @@
+# stdlib
+import atexit
+import os
+import re
+import shutil
+import sqlite3
+import threading
+import time
+
+from deep_generative_ensemble import DGE_serialization
+from deep_generative_ensemble.DGE_streaming import MANIFEST
+
+# third party
+import pandas as pd
+
+# folders managed by the cache, relative to the working directory of the experiments
+ROOTS = ["workspace", "synthetic_data", "results"]
+
+# never evicted: the scores (e.g. results.sqlite of DGE_results) and figures
+PINNED_ROOTS = ["results"]
+
+# results are saved as results/{dataset}_{model_name}_nmax_{max_n}_nsyn_{nsyn}..., see
+# get_folder_names
+RESULTS_PATTERN = re.compile(
+    r"^(?P<config>.+)_nmax_(?P<max_n>[^_]+)_nsyn_(?P<nsyn>\d+)"
+)
+
+
+class CacheManager:
+    """Keeps workspace/, synthetic_data/ and results/ within a byte budget.
+
+    An SQLite index holds the size and last access time of every file. Access times
+    are updated for every artifact read or written through DGE_serialization once
+    track_access has been called, and otherwise fall back to the file's atime/mtime.
+    enforce_budget evicts the least recently used files that are not pinned, and
+    streams (see DGE_streaming) as a whole. results/ is always pinned.
+    """
+
+    def __init__(self, index_path=".dge_cache.sqlite", roots=None):
+        self.roots = roots or ROOTS
+        self.lock = threading.Lock()
+        self.pending = {}
+        self.conn = sqlite3.connect(index_path, check_same_thread=False)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS files "
+            "(path TEXT PRIMARY KEY, size INTEGER, last_access REAL)"
+        )
+        self.conn.execute("CREATE TABLE IF NOT EXISTS pins (prefix TEXT PRIMARY KEY)")
+        self.conn.commit()
+
+    def close(self):
+        if self.touch in DGE_serialization.ACCESS_HOOKS:
+            DGE_serialization.ACCESS_HOOKS.remove(self.touch)
+        atexit.unregister(self.flush)
+        self.flush()
+        self.conn.close()
+
+    def track_access(self):
+        """Record the access time of every artifact read or written from now on"""
+        DGE_serialization.ACCESS_HOOKS.append(self.touch)
+        atexit.register(self.flush)
+        return self
+
+    def touch(self, path):
+        with self.lock:
+            self.pending[os.path.normpath(path)] = time.time()
+            n_pending = len(self.pending)
+        if n_pending >= 100:
+            self.flush()
+
+    def flush(self):
+        """Write pending access times to the index"""
+        with self.lock:
+            pending, self.pending = self.pending, {}
+            self.conn.executemany(
+                "INSERT INTO files (path, size, last_access) VALUES (?, 0, ?) "
+                "ON CONFLICT(path) DO UPDATE SET last_access = excluded.last_access",
+                pending.items(),
+            )
+            self.conn.commit()
+
+    def scan(self):
+        """Update the sizes in the index from disk, and drop files that are gone"""
+        self.flush()
+        found = []
+        for root in self.roots:
+            found += _walk(root)
+
+        with self.lock:
+            self.conn.execute(
+                "CREATE TEMP TABLE IF NOT EXISTS found (path, size, atime)"
+            )
+            self.conn.execute("DELETE FROM found")
+            self.conn.executemany("INSERT INTO found VALUES (?, ?, ?)", found)
+            self.conn.execute(
+                "DELETE FROM files WHERE path NOT IN (SELECT path FROM found)"
+            )
+            # keep recorded access times, which are more reliable than atime
+            self.conn.execute(
+                "INSERT INTO files (path, size, last_access) "
+                "SELECT path, size, atime FROM found WHERE true "
+                "ON CONFLICT(path) DO UPDATE SET size = excluded.size, "
+                "last_access = MAX(last_access, excluded.last_access)"
+            )
+            self.conn.commit()
+
+    def pin(self, path):
+        """Never evict path, or anything under it if it is a folder"""
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR IGNORE INTO pins VALUES (?)", (os.path.normpath(path),)
+            )
+            self.conn.commit()
+
+    def unpin(self, path):
+        with self.lock:
+            self.conn.execute(
+                "DELETE FROM pins WHERE prefix = ?", (os.path.normpath(path),)
+            )
+            self.conn.commit()
+
+    def pin_recorded_results(self, results_root="results"):
+        """Pin the workspace and synthetic data of every configuration with results.
+
+        Returns the pinned folders.
+        """
+        pinned = []
+        if not os.path.isdir(results_root):
+            return pinned
+
+        for name in os.listdir(results_root):
+            match = RESULTS_PATTERN.match(name)
+            if match is None:
+                continue
+            config = _split_config(match.group("config"), self.roots)
+            if config is None:
+                continue
+
+            dataset, model_name = config
+            workspace_folder = os.path.join(
+                "workspace",
+                dataset,
+                model_name,
+                f"nmax_{match.group('max_n')}_nsyn_{match.group('nsyn')}",
+            )
+            data_folder = os.path.join("synthetic_data", dataset, model_name)
+            for folder in [workspace_folder, data_folder]:
+                if folder not in pinned:
+                    self.pin(folder)
+                    pinned.append(folder)
+        return pinned
+
+    def _pins(self):
+        return [row[0] for row in self.conn.execute("SELECT prefix FROM pins")]
+
+    def index(self):
+        """All indexed files with their size, last access and whether they are pinned"""
+        self.flush()
+        with self.lock:
+            files = pd.read_sql("SELECT * FROM files WHERE size > 0", self.conn)
+            pins = self._pins() + PINNED_ROOTS
+        files["pinned"] = files["path"].map(
+            lambda path: any(path == p or path.startswith(p + os.sep) for p in pins)
+        )
+        return files
+
+    def enforce_budget(self, budget_bytes, dry_run=False, verbose=False):
+        """Evict least recently used, unpinned files until the cache fits the budget.
+
+        A stream folder is evicted with its manifest and all its parts, so that no
+        stream is left with missing parts.
+
+        Returns the evicted files and stream folders (or, with dry_run, those that
+        would be evicted).
+        """
+        self.scan()
+        files = self.index()
+        excess = files["size"].sum() - budget_bytes
+        if excess <= 0:
+            return files.iloc[:0]
+
+        units = _eviction_units(files)
+        candidates = units[~units["pinned"]].sort_values("last_access")
+        evicted = candidates[candidates["size"].cumsum().shift(fill_value=0) < excess]
+
+        if not dry_run:
+            for path in evicted["path"]:
+                if verbose:
+                    print(f"Evicting {path}")
+                if os.path.isdir(path):
+                    shutil.rmtree(path, ignore_errors=True)
+                elif os.path.exists(path):
+                    os.remove(path)
+                _remove_empty_parents(os.path.dirname(path), self.roots)
+
+            with self.lock:
+                # stream folders are deleted with everything under them
+                self.conn.executemany(
+                    "DELETE FROM files WHERE path = ? OR substr(path, 1, ?) = ?",
+                    [(p, len(p) + 1, p + os.sep) for p in evicted["path"]],
+                )
+                self.conn.commit()
+
+        return evicted
+
+    def report(self, scan=True):
+        """du-style summary of the cache per root, dataset and generator"""
+        if scan:
+            self.scan()
+        files = self.index()
+        keys = files["path"].map(_describe)
+        files["root"] = keys.str[0]
+        files["dataset"] = keys.str[1]
+        files["generator"] = keys.str[2]
+        report = files.groupby(["root", "dataset", "generator"]).agg(
+            files=("path", "count"),
+            bytes=("size", "sum"),
+            pinned_bytes=("size", lambda s: s[files.loc[s.index, "pinned"]].sum()),
+            last_access=("last_access", "max"),
+        )
+        report["MB"] = report["bytes"] / 2**20
+        report["last_access"] = pd.to_datetime(report["last_access"], unit="s")
+        return report.sort_values("bytes", ascending=False)
+
+
+def _walk(folder):
+    """(path, size, last access) of all files under folder, using os.scandir"""
+    files = []
+    if not os.path.isdir(folder):
+        return files
+    stack = [folder]
+    while stack:
+        with os.scandir(stack.pop()) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    stat = entry.stat(follow_symlinks=False)
+                    files.append(
+                        (
+                            os.path.normpath(entry.path),
+                            stat.st_size,
+                            max(stat.st_atime, stat.st_mtime),
+                        )
+                    )
+    return files
+
+
+def _eviction_units(files):
+    """The indexed files grouped into what is evicted together: every stream folder,
+    i.e. a folder with a manifest, is one unit, every other file is its own"""
+    streams = {
+        os.path.dirname(path)
+        for path in files["path"]
+        if os.path.basename(path) == MANIFEST
+    }
+
+    def unit(path):
+        folder = os.path.dirname(path)
+        return folder if folder in streams else path
+
+    return (
+        files.assign(path=files["path"].map(unit))
+        .groupby("path", as_index=False)
+        .agg(
+            size=("size", "sum"),
+            last_access=("last_access", "max"),
+            pinned=("pinned", "any"),
+        )
+    )
+
+
+def _split_config(config, roots):
+    """Split '{dataset}_{model_name}' into the dataset and model name that exist on
+    disk, since both can contain underscores"""
+    parts = config.split("_")
+    for i in range(1, len(parts)):
+        dataset, model_name = "_".join(parts[:i]), "_".join(parts[i:])
+        for root in ["workspace", "synthetic_data"]:
+            folder = os.path.join(root, dataset, model_name)
+            if root in roots and os.path.isdir(folder):
+                return dataset, model_name
+    return None
+
+
+def _describe(path):
+    """(root, dataset, generator) of a cached file"""
+    parts = path.split(os.sep)
+    if parts[0] in ["workspace", "synthetic_data"] and len(parts) > 3:
+        return parts[0], parts[1], parts[2]
+    if parts[0] == "results":
+        match = RESULTS_PATTERN.match(parts[1])
+        if match is not None:
+            config = match.group("config")
+            dataset, model_name = _split_config(config, ROOTS) or (config, "")
+            return parts[0], dataset, model_name
+    return parts[0], "", ""
+
+
+def _remove_empty_parents(folder, roots):
+    while folder and folder not in roots and os.path.isdir(folder):
+        if os.listdir(folder):
+            return
+        os.rmdir(folder)
+        folder = os.path.dirname(folder)
@@ -0,0 +1,178 @@
+# stdlib
+import time
+
+# third party
+import numpy as np
+import pandas as pd
+
+ACTIVATIONS = {
+    "identity": lambda x: x,
+    "relu": lambda x: np.maximum(x, 0),
+    "tanh": np.tanh,
+    "logistic": lambda x: 1 / (1 + np.exp(-x)),
+}
+
+
+def _softmax(x):
+    x = x - x.max(axis=-1, keepdims=True)
+    e = np.exp(x)
+    return e / e.sum(axis=-1, keepdims=True)
+
+
+def _layers(estimator):
+    """Weights, biases, hidden and output activation of a fitted linear model or MLP"""
+    name = type(estimator).__name__
+    if name in ["MLPClassifier", "MLPRegressor"]:
+        return (
+            list(estimator.coefs_),
+            list(estimator.intercepts_),
+            estimator.activation,
+            estimator.out_activation_,
+        )
+    elif name == "LogisticRegression":
+        if estimator.coef_.shape[0] != 1:
+            raise ValueError("Only binary logistic regression can be compiled")
+        return [estimator.coef_.T], [estimator.intercept_], "identity", "logistic"
+    elif name == "LinearRegression":
+        coef = np.reshape(estimator.coef_, (-1, estimator.n_features_in_)).T
+        intercept = np.reshape(estimator.intercept_, -1)
+        return [coef], [intercept], "identity", "identity"
+    raise ValueError(f"Cannot compile models of type {name}")
+
+
+class CompiledEnsemble:
+    """A DGE of linear models or MLPs as stacked weight matrices.
+
+    Layer l of all K members is stored as one K x n_in x n_out array, with the
+    StandardScaler of every member folded into its first layer, so predicting with all
+    members is a few batched matmuls.
+    """
+
+    def __init__(self, weights, biases, activation, out_activation, targettype):
+        self.weights = weights
+        self.biases = biases
+        self.activation = activation
+        self.out_activation = out_activation
+        self.targettype = targettype
+
+    def forward(self, X):
+        """Outputs of the last layer of every member, shape K x n x n_out"""
+        H = np.asarray(X, dtype=self.weights[0].dtype)
+        for j, (W, b) in enumerate(zip(self.weights, self.biases)):
+            H = np.matmul(H, W) + b
+            if j < len(self.weights) - 1:
+                H = ACTIVATIONS[self.activation](H)
+
+        if self.out_activation == "softmax":
+            return _softmax(H)
+        return ACTIVATIONS[self.out_activation](H)
+
+    def predict_members(self, X):
+        """Predictions of every member, shape K x n. For classification, these are the
+        probabilities of the positive class, as predict_proba(X)[:, 1]"""
+        out = self.forward(X)
+        if self.targettype == "classification" and out.shape[-1] > 1:
+            return out[..., 1]
+        return out[..., 0]
+
+    def predict_mean_std(self, X):
+        preds = self.predict_members(X)
+        return preds.mean(axis=0), preds.std(axis=0)
+
+
+def compile_ensemble(models, targettype="classification", dtype=np.float64):
+    """Compile fitted Pipeline([StandardScaler, model]) members into a CompiledEnsemble.
+
+    Args:
+        models (list): Fitted pipelines of init_model with model type "lr" or one of
+            the MLPs, e.g. the trained_models returned by aggregate. All members need
+            the same architecture.
+        targettype (str, optional): "classification" or "regression".
+        dtype (optional): Precision of the stacked weights. Defaults to np.float64.
+
+    Returns:
+        CompiledEnsemble
+    """
+    layers = []
+    for model in models:
+        scaler = model.named_steps["scaler"]
+        weights, biases, activation, out_activation = _layers(
+            model.named_steps["model"]
+        )
+        weights, biases = list(weights), list(biases)
+
+        # fold (x - mean) / scale into the first layer
+        d = weights[0].shape[0]
+        scale = scaler.scale_ if scaler.scale_ is not None else np.ones(d)
+        mean = scaler.mean_ if scaler.with_mean else np.zeros(d)
+        weights[0] = weights[0] / scale[:, None]
+        biases[0] = biases[0] - mean @ weights[0]
+
+        layers.append((weights, biases, activation, out_activation))
+
+    shapes = [[W.shape for W in weights] for weights, _, _, _ in layers]
+    if any(shape != shapes[0] for shape in shapes):
+        raise ValueError("All members need the same architecture to be compiled")
+    if len(set((a, o) for _, _, a, o in layers)) > 1:
+        raise ValueError("All members need the same activations to be compiled")
+
+    n_layers = len(shapes[0])
+    weights = [
+        np.stack([member[0][j] for member in layers]).astype(dtype)
+        for j in range(n_layers)
+    ]
+    biases = [
+        np.stack([member[1][j] for member in layers])[:, None, :].astype(dtype)
+        for j in range(n_layers)
+    ]
+    _, _, activation, out_activation = layers[0]
+    return CompiledEnsemble(weights, biases, activation, out_activation, targettype)
+
+
+def predict_members_loop(models, X, targettype="classification"):
+    """Reference predictions of every member, one model at a time, shape K x n"""
+    if targettype == "regression":
+        return np.stack([np.ravel(model.predict(X)) for model in models])
+    return np.stack([model.predict_proba(X)[:, 1] for model in models])
+
+
+def compile_benchmark(
+    models, X, targettype="classification", n_repeats=10, rtol=1e-6, atol=1e-8
+):
+    """Checks that the compiled ensemble matches the fitted models and times both.
+
+    Raises a ValueError if the predictions of any member differ beyond rtol/atol.
+
+    Returns:
+        pd.DataFrame with the max absolute difference, the mean latency (s) of
+        predicting all members with the per-model loop and with the compiled ensemble,
+        and the speedup
+    """
+    compiled = compile_ensemble(models, targettype)
+
+    expected = predict_members_loop(models, X, targettype)
+    actual = compiled.predict_members(X)
+    if not np.allclose(actual, expected, rtol=rtol, atol=atol):
+        raise ValueError(
+            "Compiled ensemble differs from the fitted models, max abs difference "
+            f"{np.max(np.abs(actual - expected))}"
+        )
+
+    latencies = {}
+    for name, predict in [
+        ("loop", lambda: predict_members_loop(models, X, targettype)),
+        ("compiled", lambda: compiled.predict_members(X)),
+    ]:
+        start = time.perf_counter()
+        for _ in range(n_repeats):
+            predict()
+        latencies[name] = (time.perf_counter() - start) / n_repeats
+
+    return pd.DataFrame(
+        {
+            "Max abs diff": [np.max(np.abs(actual - expected))],
+            "Loop (s)": [latencies["loop"]],
+            "Compiled (s)": [latencies["compiled"]],
+            "Speedup": [latencies["loop"] / latencies["compiled"]],
+        }
+    )
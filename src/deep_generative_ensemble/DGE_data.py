@@ -1,34 +1,165 @@
 # stdlib
 import os
-import pickle
 
-from deep_generative_ensemble.data.dataloader_adult import load_adult_census
-from deep_generative_ensemble.data.dataloader_covid import load_covid
-from deep_generative_ensemble.data.dataloader_seer_cutract import load_seer_cutract
+from deep_generative_ensemble import DGE_serialization
+from deep_generative_ensemble.DGE_generators import make_generator
+from deep_generative_ensemble.DGE_profiling import profile_stage, profile_tags
+from deep_generative_ensemble.DGE_seeding import derive_seed, rng
+from deep_generative_ensemble.DGE_streaming import (
+    batch_sizes,
+    read_stream,
+    stream_rows,
+    write_stream,
+)
 
 # third party
-import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
-from sklearn.datasets import (
-    fetch_california_housing,
-    fetch_covtype,
-    load_breast_cancer,
-    load_diabetes,
-    load_digits,
-    load_iris,
-    load_wine,
-    make_circles,
-    make_moons,
-)
 
-# synthcity absolute
-from synthcity.plugins import Plugins
-from synthcity.plugins.core.dataloader import GenericDataLoader
-from synthcity.utils import reproducibility
+# The dataset loaders, plotting and synthcity are imported in the functions that use
+# them, see DGE_utils.
+
+# Datasets are stored with compact dtypes, see downcast_frame. Discrete columns (label
+# encoded, binary) become int8 or int16 rather than category, so that unpack(as_numpy=
+# True) still gives one numeric array, and all other columns become float32. Mixing
+# these gives float32 arrays, which is what the estimators get.
+INTEGER_DTYPES = [np.int8, np.int16]
+# largest integer float32 represents exactly
+FLOAT32_EXACT = 2**24
+
+# rows generated per synthetic dataset, we won't need more in any experiment
+N_GENERATED = 20000
+# With DGE_STREAM_BATCH set, synthetic data is generated in batches of that many rows
+# and streamed to disk (see DGE_streaming), so that only one batch is in memory, and
+# only the rows that are used are read back.
+STREAM_BATCH = int(os.environ.get("DGE_STREAM_BATCH", 0))
+
+# Generation strategies of the synthetic datasets and their default parameter. A
+# strategy is given as its name, optionally with a parameter, e.g. "shared_fit_4":
+# - independent: every member fits its own generator
+# - shared_fit: groups of members (4, by default 5) draw independent samples from one
+#   fitted generator. These are not snapshots of the generator at different epochs,
+#   the generators of synthcity can not be checkpointed during training
+# - bagging: every generator is fitted on its own subsample of the training data, a
+#   fraction of it (by default 0.5) drawn without replacement
+# - bootstrap: as bagging, drawn with replacement (by default 1, as many rows)
+# Every strategy but independent is part of the cache filename of the datasets.
+STRATEGIES = {
+    "independent": None,
+    "shared_fit": "5",
+    "bagging": "0.5",
+    "bootstrap": "1",
+}
+
+
+def parse_strategy(strategy):
+    """(name, parameter) of a generation strategy, see STRATEGIES"""
+    if strategy in STRATEGIES:
+        return strategy, STRATEGIES[strategy]
+    # names may contain "_" themselves, parameters do not
+    name, _, param = strategy.rpartition("_")
+    if name not in STRATEGIES:
+        raise ValueError(f"Unknown strategy {strategy}, choose from {list(STRATEGIES)}")
+    return name, param
+
+
+def stream_folder(filename):
+    """Folder of the stream of the synthetic dataset cached in filename"""
+    return os.path.splitext(filename)[0] + ".parts"
+
+
+def synthetic_filename(data_folder, n_train, i, strategy="independent"):
+    if parse_strategy(strategy)[0] == "independent":
+        return f"{data_folder}/Xsyn_n{n_train}_seed{i}.pkl"
+    return f"{data_folder}/Xsyn_n{n_train}_{strategy}_seed{i}.pkl"
+
+
+def infer_dtypes(df):
+    """Compact dtype of every numeric column of df, see downcast_frame"""
+    dtypes = {}
+    for column in df.columns:
+        values = df[column]
+        if values.dtype == bool:
+            dtypes[column] = np.dtype(bool)
+        elif not pd.api.types.is_numeric_dtype(values):
+            continue
+        elif _is_integral(values):
+            low, high = values.min(), values.max()
+            fits = [
+                dtype
+                for dtype in INTEGER_DTYPES
+                if np.iinfo(dtype).min <= low and high <= np.iinfo(dtype).max
+            ]
+            if fits:
+                dtypes[column] = np.dtype(fits[0])
+            elif max(-low, high) <= FLOAT32_EXACT:
+                dtypes[column] = np.dtype(np.float32)
+            else:
+                dtypes[column] = np.dtype(np.float64)
+        else:
+            dtypes[column] = np.dtype(np.float32)
+    return dtypes
+
+
+def _is_integral(values):
+    values = values.to_numpy()
+    return bool(np.isfinite(values).all() and (np.mod(values, 1) == 0).all())
+
+
+def downcast_frame(df, dtypes=None, name="", verbose=False):
+    """df with compact dtypes.
+
+    Args:
+        df (pd.DataFrame): Data, including the target column.
+        dtypes (dict, optional): Column -> dtype, e.g. of the real data, so that
+            synthetic data gets the same schema. Defaults to infer_dtypes(df). Integer
+            dtypes are only used for columns that have integral values in df, other
+            columns become float32.
+        name (str, optional): Name of df for the memory report.
+        verbose (bool, optional): Print the memory saved. Defaults to False.
+
+    Returns:
+        pd.DataFrame, bytes saved
+    """
+    before = df.memory_usage(deep=True).sum()
+    if dtypes is None:
+        dtypes = infer_dtypes(df)
+
+    casts = {}
+    for column, dtype in dtypes.items():
+        if column not in df.columns:
+            continue
+        values = df[column]
+        if dtype.kind == "b" and not values.isin([0, 1]).all():
+            dtype = np.dtype(np.float32)
+        elif dtype.kind in "iu" and not _is_integral(values):
+            dtype = np.dtype(np.float32)
+        casts[column] = dtype
+    df = df.astype(casts)
 
+    saved = before - df.memory_usage(deep=True).sum()
+    if verbose:
+        print(f"Downcast {name}: {before / 2**20:.2f} MB, {saved / 2**20:.2f} MB saved")
+    return df, saved
+
+
+def load_real_data(dataset, p_train=0.8, max_n=None, reduce_to=20000, verbose=False):
+    # third party
+    from sklearn.datasets import (
+        fetch_california_housing,
+        fetch_covtype,
+        load_breast_cancer,
+        load_diabetes,
+        load_digits,
+        load_iris,
+        load_wine,
+        make_circles,
+        make_moons,
+    )
+
+    # synthcity absolute
+    from synthcity.plugins.core.dataloader import GenericDataLoader
 
-def load_real_data(dataset, p_train=0.8, max_n=None, reduce_to=20000):
     if dataset == "diabetes":
         X, y = load_diabetes(return_X_y=True, as_frame=True)
     elif dataset == "iris":
@@ -38,8 +169,12 @@ def load_real_data(dataset, p_train=0.8, max_n=None, reduce_to=20000):
     elif dataset == "wine":
         X, y = load_wine(return_X_y=True, as_frame=True)
     elif dataset == "adult":
+        from deep_generative_ensemble.data.dataloader_adult import load_adult_census
+
         X, y = load_adult_census(as_frame=True)
     elif dataset == "covid":
+        from deep_generative_ensemble.data.dataloader_covid import load_covid
+
         X, y = load_covid(reduce_to=reduce_to)
 
     elif dataset == "digits":
@@ -52,10 +187,11 @@ def load_real_data(dataset, p_train=0.8, max_n=None, reduce_to=20000):
         X = pd.DataFrame(X)
     elif dataset == "gaussian":
         n_real = 40000
-        X = np.random.randn(n_real, 2)
+        generator = rng("load_real_data", dataset)
+        X = generator.standard_normal((n_real, 2))
         X = pd.DataFrame(X)
         noise = 2
-        y = X[0] > noise * (np.random.uniform(size=n_real) - 1 / 2)
+        y = X[0] > noise * (generator.uniform(size=n_real) - 1 / 2)
     elif dataset == "cal_housing":
         X = fetch_california_housing()
         X, y = X.data, X.target
@@ -65,17 +201,23 @@ def load_real_data(dataset, p_train=0.8, max_n=None, reduce_to=20000):
         X, y = X.data, X.target
         X = pd.DataFrame(X)
     elif dataset in ["seer", "cutract"]:
+        from deep_generative_ensemble.data.dataloader_seer_cutract import (
+            load_seer_cutract,
+        )
+
         X, y = load_seer_cutract(name=dataset, seed=0, reduce_to=reduce_to)
         X = pd.DataFrame(X)
     elif dataset in ["uniform", "test"]:
         n_real = 10000
-        X = np.random.uniform(size=(n_real, 2))
+        generator = rng("load_real_data", dataset)
+        X = generator.uniform(size=(n_real, 2))
         X = pd.DataFrame(X)
-        y = X[0] > np.random.uniform(size=n_real)
+        y = X[0] > generator.uniform(size=n_real)
     else:
         raise ValueError("Unknown dataset")
 
     X["target"] = y
+    X, _ = downcast_frame(X, name=dataset, verbose=verbose)
     if max_n is not None and X.shape[0] * p_train > max_n:
         p_train = max_n / X.shape[0]
     X_gt = GenericDataLoader(X, target_column="target", train_size=p_train)
@@ -99,41 +241,44 @@ def get_synthetic_data(
     load_syn=True,
     save=True,
     verbose=False,
+    strategy="independent",
 ):
+    """n_models synthetic datasets of nsyn rows, generated with strategy (see
+    STRATEGIES) and cached in data_folder"""
     X_train = X_gt.train()
-    n_train = X_train.shape[0]
     X_syns = []
+    saved = 0
+    # the schema of the real data, so that all datasets have the same dtypes
+    dtypes = infer_dtypes(X_gt.dataframe())
+    # the generator shared by consecutive members, see generate_shared_fit
+    shared_fit = {}
 
     # generate synthetic data using ensemble. Change seeds across models
     for i in range(n_models):
-        os.makedirs(data_folder, exist_ok=True)
-        filename = f"{data_folder}/Xsyn_n{n_train}_seed{i}.pkl"
-
-        # Load data from disk if it exists and load_syn is True
-        if os.path.exists(filename) and load_syn:
-            X_syn = pickle.load(open(filename, "rb"))
-
-            if len(X_syn) < nsyn:
-                # generate more data if nsyn is too small
-                if verbose:
-                    print("Generating more data, existing dataset is smaller than nsyn")
-                X_syn = generate_synthetic(
-                    model_name, n_models, save, verbose, X_train, i, filename
-                )
-
-        else:
-            # Otherwise generate new data
-            if verbose:
-                print("Generating new data, filename is", filename)
-            X_syn = generate_synthetic(
-                model_name, n_models, save, verbose, X_train, i, filename
-            )
-
-        X_syn = GenericDataLoader(X_syn[:nsyn], target_column="target")
-        X_syn.targettype = X_gt.targettype
+        X_syn, saved_i = get_synthetic_member(
+            X_gt,
+            model_name,
+            i,
+            n_models,
+            nsyn,
+            data_folder,
+            X_train=X_train,
+            dtypes=dtypes,
+            load_syn=load_syn,
+            save=save,
+            verbose=verbose,
+            strategy=strategy,
+            shared_fit=shared_fit,
+        )
+        saved += saved_i
         X_syns.append(X_syn)
 
     if verbose:
+        print(f"Downcast {n_models} synthetic datasets, {saved / 2**20:.2f} MB saved")
+
+        # third party
+        import matplotlib.pyplot as plt
+
         # plot what we generated and compare to real
         X_syn_all = np.concatenate(
             [X_syns[i].unpack(as_numpy=True)[0] for i in range(len(X_syns))]
@@ -146,43 +291,257 @@ def get_synthetic_data(
     return X_syns
 
 
-def generate_synthetic(model_name, n_models, save, verbose, X_train, i, filename):
+def get_synthetic_member(
+    X_gt,
+    model_name,
+    i,
+    n_models,
+    nsyn,
+    data_folder,
+    X_train=None,
+    dtypes=None,
+    load_syn=True,
+    save=True,
+    verbose=False,
+    strategy="independent",
+    shared_fit=None,
+):
+    """Synthetic dataset i of get_synthetic_data, loaded or generated with strategy
+    (see STRATEGIES). X_train and dtypes default to X_gt.train() and the schema of X_gt.
+    shared_fit is passed on to generate_shared_fit, to share generators across calls.
+
+    Returns:
+        GenericDataLoader, bytes saved by downcast_frame
+    """
+    # synthcity absolute
+    from synthcity.plugins.core.dataloader import GenericDataLoader
+
+    if X_train is None:
+        X_train = X_gt.train()
+    n_train = X_train.shape[0]
+    if dtypes is None:
+        dtypes = infer_dtypes(X_gt.dataframe())
+
+    os.makedirs(data_folder, exist_ok=True)
+    filename = synthetic_filename(data_folder, n_train, i, strategy)
+
+    # Load data from disk if it exists and load_syn is True, streams first
+    if load_syn and stream_rows(stream_folder(filename)) >= nsyn:
+        X_syn = read_stream(stream_folder(filename), nsyn)
+    elif os.path.exists(filename) and load_syn:
+        X_syn = DGE_serialization.load(filename)
+
+        if len(X_syn) < nsyn:
+            # generate more data if nsyn is too small
+            if verbose:
+                print("Generating more data, existing dataset is smaller than nsyn")
+            X_syn = generate_member(
+                model_name,
+                n_models,
+                save,
+                verbose,
+                X_train,
+                i,
+                filename,
+                strategy,
+                shared_fit,
+            )
+
+    else:
+        # Otherwise generate new data
+        if verbose:
+            print("Generating new data, filename is", filename)
+        X_syn = generate_member(
+            model_name,
+            n_models,
+            save,
+            verbose,
+            X_train,
+            i,
+            filename,
+            strategy,
+            shared_fit,
+        )
+
+    if X_syn is None:
+        # streamed to disk, read back the rows that are used only
+        X_syn = read_stream(stream_folder(filename), nsyn)
+    X_syn, saved = downcast_frame(X_syn[:nsyn], dtypes, name=filename, verbose=verbose)
+    X_syn = GenericDataLoader(X_syn, target_column="target")
+    X_syn.targettype = X_gt.targettype
+    return X_syn, saved
+
+
+def iter_synthetic_data(
+    X_gt,
+    model_name,
+    max_models,
+    nsyn,
+    data_folder,
+    load_syn=True,
+    save=True,
+    verbose=False,
+    strategy="independent",
+):
+    """The synthetic datasets of get_synthetic_data, each generated only when it is
+    asked for, e.g. by aggregate_adaptive"""
+    X_train = X_gt.train()
+    dtypes = infer_dtypes(X_gt.dataframe())
+    shared_fit = {}
+    for i in range(max_models):
+        X_syn, _ = get_synthetic_member(
+            X_gt,
+            model_name,
+            i,
+            max_models,
+            nsyn,
+            data_folder,
+            X_train=X_train,
+            dtypes=dtypes,
+            load_syn=load_syn,
+            save=save,
+            verbose=verbose,
+            strategy=strategy,
+            shared_fit=shared_fit,
+        )
+        yield _label_synthetic(X_syn, getattr(X_gt, "dataset", None), X_gt.targettype)
+
+
+def generate_synthetic(
+    model_name, n_models, save, verbose, X_train, i, filename, random_state=None
+):
+    """Fit generator i and generate its synthetic data. random_state defaults to a
+    seed derived from the generator and i, see DGE_seeding"""
     if verbose:
         print(f"Training model {i+1}/{n_models}")
     print(model_name)
-    reproducibility.enable_reproducible_results()
-    if "_deep" in model_name:
-        syn_model = Plugins().get(
-            model_name.replace("_deep", ""),
-            discriminator_n_layers_hidden=3,
-            generator_n_layers_hidden=3,
-        )
-    elif "_shallow" in model_name:
-        syn_model = Plugins().get(
-            model_name.replace("_shallow", ""),
-            discriminator_n_layers_hidden=1,
-            generator_n_layers_hidden=1,
-        )
-    elif "_smallest" in model_name:
-        syn_model = Plugins().get(
-            model_name.replace("_smallest", ""),
-            discriminator_n_layers_hidden=1,
-            generator_n_layers_hidden=1,
-            generator_n_units_hidden=100,
-            discriminator_n_units_hidden=100,
+    if random_state is None:
+        random_state = derive_seed("generate_synthetic", model_name, i)
+    syn_model = make_generator(model_name, random_state)
+    with profile_tags(generator=model_name, seed=i):
+        with profile_stage("generate_synthetic.fit", n=len(X_train)):
+            syn_model.fit(X_train)
+        with profile_stage("generate_synthetic.generate", n=N_GENERATED):
+            X_syn = _generate(syn_model, filename, save)
+
+    return X_syn
+
+
+def generate_shared_fit(
+    model_name,
+    n_models,
+    save,
+    verbose,
+    X_train,
+    i,
+    filename,
+    members_per_fit,
+    shared_fit,
+):
+    """Synthetic data of member i from a generator shared by members_per_fit members.
+
+    The members of a group are independent samples of one training run of the
+    generator, fitted for the first member that needs it and kept in the dict
+    shared_fit for the others, so callers pass the same dict for consecutive members.
+    """
+    group = i // members_per_fit
+    key = (model_name, os.path.dirname(filename), len(X_train), members_per_fit, group)
+    if shared_fit.get("key") != key:
+        if verbose:
+            print(f"Training model {group+1}/{-(-n_models // members_per_fit)}")
+        syn_model = make_generator(model_name, derive_seed("shared_fit", *key))
+        with profile_tags(generator=model_name, seed=group):
+            with profile_stage("generate_synthetic.fit", n=len(X_train)):
+                syn_model.fit(X_train)
+        shared_fit.clear()
+        shared_fit.update(key=key, model=syn_model)
+
+    with profile_tags(generator=model_name, seed=i):
+        with profile_stage("generate_synthetic.generate", n=N_GENERATED):
+            X_syn = _generate(
+                shared_fit["model"], filename, save, random_state=derive_seed(filename)
+            )
+
+    return X_syn
+
+
+def _generate(syn_model, filename, save, **generate_kwargs):
+    """N_GENERATED rows of syn_model, saved in filename. With STREAM_BATCH, they are
+    streamed to stream_folder(filename) instead and None is returned"""
+    if STREAM_BATCH and save:
+        # every batch needs its own seed, or generators seeded per call repeat rows
+        batches = (
+            syn_model.generate(count=count, random_state=derive_seed(filename, part))
+            for part, count in enumerate(batch_sizes(N_GENERATED, STREAM_BATCH))
         )
-    else:
-        syn_model = Plugins().get(model_name)
-    syn_model.fit(X_train)
-    X_syn = syn_model.generate(count=20000)  # we won't need more in any experiment
+        write_stream(batches, stream_folder(filename))
+        return None
 
-    # save X_syn to disk as pickle
+    X_syn = syn_model.generate(count=N_GENERATED, **generate_kwargs)
+    # save X_syn to disk with the configured codec
     if save:
-        pickle.dump(X_syn, open(filename, "wb"))
-
+        DGE_serialization.dump(X_syn, filename)
     return X_syn
 
 
+def subsample(X_train, fraction, replace, *keys):
+    """Random rows of X_train, a fraction of them, seeded by keys (see DGE_seeding)"""
+    # synthcity absolute
+    from synthcity.plugins.core.dataloader import GenericDataLoader
+
+    df = X_train.dataframe()
+    n = max(int(round(fraction * len(df))), 1)
+    if not replace and n > len(df):
+        raise ValueError(f"Cannot subsample {fraction} of the data without replacement")
+    rows = rng("subsample", *keys).choice(len(df), n, replace=replace)
+    X_sub = GenericDataLoader(
+        df.iloc[rows].reset_index(drop=True), target_column=X_train.target_column
+    )
+    X_sub.targettype = getattr(X_train, "targettype", None)
+    return X_sub
+
+
+def generate_member(
+    model_name,
+    n_models,
+    save,
+    verbose,
+    X_train,
+    i,
+    filename,
+    strategy="independent",
+    shared_fit=None,
+):
+    """Synthetic data of member i with a generation strategy, see STRATEGIES.
+    shared_fit is the dict generate_shared_fit keeps its generator in, a new one if
+    None"""
+    name, param = parse_strategy(strategy)
+    if name in ["bagging", "bootstrap"]:
+        X_train = subsample(X_train, float(param), name == "bootstrap", filename)
+    if name != "shared_fit":
+        return generate_synthetic(
+            model_name,
+            n_models,
+            save,
+            verbose,
+            X_train,
+            i,
+            filename,
+            random_state=derive_seed(filename),
+        )
+    return generate_shared_fit(
+        model_name,
+        n_models,
+        save,
+        verbose,
+        X_train,
+        i,
+        filename,
+        int(param),
+        {} if shared_fit is None else shared_fit,
+    )
+
+
 def get_real_and_synthetic(
     dataset,
     nsyn=None,
@@ -194,8 +553,11 @@ def get_real_and_synthetic(
     verbose=False,
     max_n=2000,
     reduce_to=20000,
+    strategy="independent",
 ):
-    X_gt = load_real_data(dataset, p_train=p_train, max_n=max_n, reduce_to=reduce_to)
+    X_gt = load_real_data(
+        dataset, p_train=p_train, max_n=max_n, reduce_to=reduce_to, verbose=verbose
+    )
     X_train, X_test = X_gt.train(), X_gt.test()
 
     X_train.targettype = X_gt.targettype
@@ -219,16 +581,23 @@ def get_real_and_synthetic(
         load_syn=load_syn,
         save=save,
         verbose=verbose,
+        strategy=strategy,
     )
 
-    for i in range(len(X_syns)):
-        X_syns[i].dataset = dataset
-        X_syns[i].targettype = X_gt.targettype
-        X_syns[i].dataset = dataset
+    X_syns = [_label_synthetic(X_syn, dataset, X_gt.targettype) for X_syn in X_syns]
 
     if dataset == "covid":
         X_gt["target"] = (X_gt["target"] - 1).astype(bool)
-        for i in range(len(X_syns)):
-            X_syns[i]["target"] = (X_syns[i]["target"] - 1).astype(bool)
 
     return X_gt, X_syns
+
+
+def _label_synthetic(X_syn, dataset, targettype):
+    X_syn.dataset = dataset
+    X_syn.targettype = targettype
+    # generators fit on the raw covid labels 1/2 of load_real_data generate those, but
+    # not the ones fit on the boolean labels of get_real_and_synthetic, e.g. in
+    # iter_synthetic_data, which must not be mapped again
+    if dataset == "covid" and X_syn["target"].dtype != bool:
+        X_syn["target"] = (X_syn["target"] - 1).astype(bool)
+    return X_syn
@@ -0,0 +1,180 @@
+# third party
+import numpy as np
+import pandas as pd
+
+
+class ArrayDataset:
+    """A dataset as a contiguous float32 feature array and a target array, which keeps
+    the dtype of the target.
+
+    Drop-in for the parts of GenericDataLoader that the experiments use (unpack,
+    train, test, dataframe, shape, targettype), without copying on every call. Rows of
+    datasets made with from_loader or from_frame are stored in split order, training
+    rows first, so train() and test() are views. The split is the one GenericDataLoader
+    makes, train_test_split with the same train_size and random_state, stratified on
+    the target if every value of it occurs more than once.
+    """
+
+    __slots__ = (
+        "X",
+        "y",
+        "columns",
+        "train_size",
+        "random_state",
+        "n_train",
+        "targettype",
+        "dataset",
+        "_splits",
+    )
+
+    def __init__(
+        self,
+        X,
+        y,
+        columns=None,
+        targettype=None,
+        train_size=0.8,
+        random_state=0,
+        dataset=None,
+    ):
+        self.X = np.ascontiguousarray(X, dtype=np.float32)
+        self.y = np.ascontiguousarray(y)
+        self.columns = list(range(self.X.shape[1])) if columns is None else columns
+        self.targettype = targettype
+        self.train_size = train_size
+        self.random_state = random_state
+        self.dataset = dataset
+        # number of training rows once the rows are in split order
+        self.n_train = None
+        self._splits = None
+
+    @classmethod
+    def from_frame(cls, df, target_column="target", **kwargs):
+        X = df.drop(columns=target_column)
+        dataset = cls(
+            X.to_numpy(), df[target_column].to_numpy(), list(X.columns), **kwargs
+        )
+        dataset._split()
+        return dataset
+
+    @classmethod
+    def from_loader(cls, loader):
+        return cls.from_frame(
+            loader.dataframe(),
+            target_column=getattr(loader, "target_column", "target"),
+            targettype=getattr(loader, "targettype", None),
+            train_size=getattr(loader, "train_size", 0.8),
+            random_state=getattr(loader, "random_state", 0),
+            dataset=getattr(loader, "dataset", None),
+        )
+
+    @classmethod
+    def concat(cls, datasets, n_limit=None):
+        first = datasets[0]
+        return cls(
+            np.concatenate([d.X[:n_limit] for d in datasets]),
+            np.concatenate([d.y[:n_limit] for d in datasets]),
+            first.columns,
+            first.targettype,
+            first.train_size,
+            first.random_state,
+            first.dataset,
+        )
+
+    def to_loader(self):
+        # synthcity absolute
+        from synthcity.plugins.core.dataloader import GenericDataLoader
+
+        loader = GenericDataLoader(
+            self.dataframe(),
+            target_column="target",
+            train_size=self.train_size,
+            random_state=self.random_state,
+        )
+        loader.targettype = self.targettype
+        loader.dataset = self.dataset
+        return loader
+
+    def rows(self, index):
+        """The dataset of the given rows, a view for slices"""
+        return ArrayDataset(
+            self.X[index],
+            self.y[index],
+            self.columns,
+            self.targettype,
+            self.train_size,
+            self.random_state,
+            self.dataset,
+        )
+
+    def _split(self):
+        if self._splits is None:
+            if self.n_train is None:
+                # third party
+                from sklearn.model_selection import train_test_split
+
+                # as GenericDataLoader, which only stratifies when it can
+                _, counts = np.unique(self.y, return_counts=True)
+                stratify = self.y if counts.min() > 1 else None
+
+                # store the rows in split order once, see the class docstring
+                train_index, test_index = train_test_split(
+                    np.arange(len(self)),
+                    train_size=self.train_size,
+                    random_state=self.random_state,
+                    stratify=stratify,
+                )
+                order = np.concatenate([train_index, test_index])
+                self.X = self.X[order]
+                self.y = self.y[order]
+                self.n_train = len(train_index)
+            self._splits = (
+                self.rows(slice(None, self.n_train)),
+                self.rows(slice(self.n_train, None)),
+            )
+        return self._splits
+
+    def train(self):
+        return self._split()[0]
+
+    def test(self):
+        return self._split()[1]
+
+    def unpack(self, as_numpy=False):
+        if as_numpy:
+            return self.X, self.y
+        return pd.DataFrame(self.X, columns=self.columns), pd.Series(
+            self.y, name="target"
+        )
+
+    def dataframe(self):
+        df = pd.DataFrame(self.X, columns=self.columns)
+        df["target"] = self.y
+        return df
+
+    @property
+    def shape(self):
+        return (self.X.shape[0], self.X.shape[1] + 1)
+
+    def __len__(self):
+        return self.X.shape[0]
+
+    def __getitem__(self, key):
+        if key == "target":
+            return self.y
+        if isinstance(key, slice):
+            return self.rows(key)
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        if key != "target":
+            raise KeyError(key)
+        self.y = np.ascontiguousarray(value)
+        self._splits = None
+
+
+def as_dataset(X):
+    """X as an ArrayDataset, converting GenericDataLoaders once at the boundary"""
+    if isinstance(X, ArrayDataset):
+        return X
+    return ArrayDataset.from_loader(X)
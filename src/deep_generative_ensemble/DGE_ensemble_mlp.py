@@ -0,0 +1,208 @@
+# stdlib
+import math
+
+from deep_generative_ensemble.DGE_seeding import torch_generator
+
+# third party
+import numpy as np
+import torch
+
+
+class EnsembleMLP:
+    """K MLPs trained together as one batched network.
+
+    The weights of every layer are stacked into a K x n_in x n_out tensor, so a forward
+    pass through all members is a single batched matmul. Each member is fed minibatches
+    of its own synthetic dataset and standardises its inputs with its own mean and std,
+    like the StandardScaler in the pipelines of init_model. The hyperparameters follow
+    sklearn's MLPClassifier/MLPRegressor (relu, adam, L2 penalty alpha).
+    """
+
+    def __init__(
+        self,
+        targettype="classification",
+        hidden_layer_sizes=(100,),
+        alpha=1e-4,
+        batch_size=200,
+        learning_rate_init=1e-3,
+        max_iter=200,
+        tol=1e-4,
+        n_iter_no_change=10,
+        random_state=None,
+    ):
+        self.targettype = targettype
+        self.hidden_layer_sizes = hidden_layer_sizes
+        self.alpha = alpha
+        self.batch_size = batch_size
+        self.learning_rate_init = learning_rate_init
+        self.max_iter = max_iter
+        self.tol = tol
+        self.n_iter_no_change = n_iter_no_change
+        self.random_state = random_state
+
+    def get_params(self, deep=True):
+        return {
+            "targettype": self.targettype,
+            "hidden_layer_sizes": self.hidden_layer_sizes,
+            "alpha": self.alpha,
+            "batch_size": self.batch_size,
+            "learning_rate_init": self.learning_rate_init,
+            "max_iter": self.max_iter,
+            "tol": self.tol,
+            "n_iter_no_change": self.n_iter_no_change,
+            "random_state": self.random_state,
+        }
+
+    def set_params(self, **params):
+        for key, value in params.items():
+            if key not in self.get_params():
+                raise ValueError(f"Invalid parameter {key} for EnsembleMLP")
+            setattr(self, key, value)
+        return self
+
+    def fit(self, Xs, ys):
+        """Fit member k on (Xs[k], ys[k]), for all K members at once"""
+        # random_state is the root of the stream, None the root seed, see DGE_seeding
+        generator = torch_generator("EnsembleMLP", root=self.random_state)
+
+        K = len(Xs)
+        d = Xs[0].shape[1]
+        n = np.array([len(X) for X in Xs])
+
+        # pad all datasets to the same length, members only sample their own rows
+        X = np.zeros((K, n.max(), d), dtype=np.float32)
+        y = np.zeros((K, n.max()), dtype=np.float32)
+        for k in range(K):
+            X[k, : n[k]] = Xs[k]
+            y[k, : n[k]] = np.ravel(ys[k])
+
+        self.mean_ = np.stack([np.mean(X_k, axis=0) for X_k in Xs])[:, None]
+        scale = np.stack([np.std(X_k, axis=0) for X_k in Xs])[:, None]
+        scale[scale == 0] = 1
+        self.scale_ = scale
+        X = (X - self.mean_) / self.scale_
+
+        if self.targettype == "classification":
+            self.classes_ = np.unique(np.concatenate([np.ravel(y_k) for y_k in ys]))
+            y = np.searchsorted(self.classes_, y)
+            n_out = 1 if len(self.classes_) == 2 else len(self.classes_)
+        else:
+            n_out = 1
+
+        X = torch.as_tensor(X, dtype=torch.float32)
+        y = torch.as_tensor(y)
+        n = torch.as_tensor(n, dtype=torch.float32)
+
+        hidden = [int(h) for h in np.atleast_1d(self.hidden_layer_sizes)]
+        sizes = [d] + hidden + [n_out]
+        params = []
+        for n_in, n_out_layer in zip(sizes[:-1], sizes[1:]):
+            # glorot uniform initialisation, as in sklearn
+            bound = math.sqrt(6 / (n_in + n_out_layer))
+            W = (torch.rand(K, n_in, n_out_layer, generator=generator) * 2 - 1) * bound
+            b = (torch.rand(K, 1, n_out_layer, generator=generator) * 2 - 1) * bound
+            params += [W.requires_grad_(), b.requires_grad_()]
+
+        optimizer = torch.optim.Adam(params, lr=self.learning_rate_init)
+        batch_size = int(min(self.batch_size, n.min().item()))
+        steps = math.ceil(n.max().item() / batch_size)
+        members = torch.arange(K)[:, None]
+
+        best_loss = np.inf
+        no_improvement = 0
+        for epoch in range(self.max_iter):
+            epoch_loss = 0
+            for _ in range(steps):
+                idx = torch.rand(K, batch_size, generator=generator) * n[:, None]
+                idx = idx.long()
+                out = self._forward(X[members, idx], params)
+                loss = self._loss(out, y[members, idx])
+                penalty = sum((W**2).sum(dim=(1, 2)) for W in params[::2])
+                loss = loss + 0.5 * self.alpha * penalty / batch_size
+
+                optimizer.zero_grad()
+                loss.sum().backward()
+                optimizer.step()
+                epoch_loss += loss.mean().item() / steps
+
+            if epoch_loss > best_loss - self.tol:
+                no_improvement += 1
+            else:
+                no_improvement = 0
+            best_loss = min(best_loss, epoch_loss)
+            if no_improvement > self.n_iter_no_change:
+                break
+
+        self.n_iter_ = epoch + 1
+        self.n_members_ = K
+        self.weights_ = [p.detach() for p in params]
+        return self
+
+    def _forward(self, X, params):
+        n_layers = len(params) // 2
+        for j in range(n_layers):
+            X = torch.baddbmm(params[2 * j + 1], X, params[2 * j])
+            if j < n_layers - 1:
+                X = torch.relu(X)
+        return X
+
+    def _loss(self, out, y):
+        """Mean loss per member, shape K"""
+        if self.targettype != "classification":
+            return ((out[..., 0] - y) ** 2).mean(dim=1) / 2
+        if out.shape[-1] == 1:
+            return torch.nn.functional.binary_cross_entropy_with_logits(
+                out[..., 0], y.float(), reduction="none"
+            ).mean(dim=1)
+        return torch.nn.functional.cross_entropy(
+            out.transpose(1, 2), y.long(), reduction="none"
+        ).mean(dim=1)
+
+    def _predict_members(self, X, member=None):
+        """Raw network outputs of shape K x n x n_out, or of one member only"""
+        members = slice(None) if member is None else slice(member, member + 1)
+        X = (np.asarray(X, dtype=np.float32)[None] - self.mean_[members]) / (
+            self.scale_[members]
+        )
+        params = [p[members] for p in self.weights_]
+        with torch.no_grad():
+            out = self._forward(torch.as_tensor(X, dtype=torch.float32), params)
+        return out.numpy()
+
+    def predict_proba(self, X, member=None):
+        """Class probabilities of all members (K x n x C), or of one member (n x C)"""
+        out = self._predict_members(X, member)
+        if out.shape[-1] == 1:
+            p = 1 / (1 + np.exp(-out))
+            proba = np.concatenate([1 - p, p], axis=-1)
+        else:
+            out = out - out.max(axis=-1, keepdims=True)
+            proba = np.exp(out) / np.exp(out).sum(axis=-1, keepdims=True)
+        return proba if member is None else proba[0]
+
+    def predict(self, X, member=None):
+        """Predictions of all members (K x n), or of one member (n)"""
+        if self.targettype == "classification":
+            pred = self.classes_[self.predict_proba(X, member).argmax(axis=-1)]
+        else:
+            pred = self._predict_members(X, member)[..., 0]
+            pred = pred if member is None else pred[0]
+        return pred
+
+    def members(self):
+        """Fitted members as separate estimators, in the order of the training sets"""
+        return [EnsembleMLPMember(self, k) for k in range(self.n_members_)]
+
+
+class EnsembleMLPMember:
+    """Member k of a fitted EnsembleMLP, with the predict API of a single estimator"""
+
+    def __init__(self, ensemble, k):
+        self.ensemble = ensemble
+        self.k = k
+
+    def predict_proba(self, X):
+        return self.ensemble.predict_proba(X, member=self.k)
+
+    def predict(self, X):
+        return self.ensemble.predict(X, member=self.k)
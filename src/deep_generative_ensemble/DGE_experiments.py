@@ -1,12 +1,18 @@
 # stdlib
 import os
-import pickle
-from pathlib import Path
+import time
 from typing import Callable, List
 
+from deep_generative_ensemble import DGE_serialization
+from deep_generative_ensemble.DGE_artifacts import ModelStore
+from deep_generative_ensemble.DGE_data import iter_synthetic_data
+from deep_generative_ensemble.DGE_dataset import as_dataset
+from deep_generative_ensemble.DGE_profiling import reset_profile_tags, set_profile_tags
+from deep_generative_ensemble.DGE_seeding import derive_seed, path_key
 from deep_generative_ensemble.DGE_utils import (
     accuracy_confidence_curve,
     aggregate,
+    aggregate_adaptive,
     aggregate_imshow,
     aggregate_predictive,
     cat_dl,
@@ -16,15 +22,10 @@ from deep_generative_ensemble.DGE_utils import (
 )
 
 # third party
-import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
-from sklearn.calibration import calibration_curve
 from sklearn.model_selection import KFold
 
-# synthcity absolute
-from synthcity.plugins.core.dataloader import GenericDataLoader
-
 ############################################################################################################
 # Model training. Predictive performance
 
@@ -41,6 +42,9 @@ def predictive_experiment(
     outlier=False,
     verbose=False,
     include_concat=False,
+    plot_queue=None,
+    results_store=None,
+    extra_syns=None,
 ):
     """Compares predictions by different approaches.
 
@@ -50,13 +54,33 @@ def predictive_experiment(
         X_test (GenericDataLoader): Real data
         load (bool, optional): Load results, if available. Defaults to True.
         save (bool, optional): Save results when done. Defaults to True.
+        plot_queue (PlotQueue, optional): Render the figures in the background
+            instead of showing them inline, see DGE_plotting.
+        results_store (ResultsStore, optional): Append the scores of every approach
+            and run, see DGE_results.
+        extra_syns (dict, optional): Label -> synthetic datasets laid out like
+            X_syns, e.g. generated with another strategy (see DGE_data). Each is
+            scored side by side as the approach "DGE$_{20}$ (label)".
 
     Returns:
 
     """
+    from deep_generative_ensemble.DGE_plotting import render_curves
+
+    # third party
+    from sklearn.calibration import calibration_curve
+
     if save and results_folder is None:
         raise ValueError("results_folder must be specified when save=True.")
 
+    # unpack every dataset once, see DGE_dataset
+    X_gt = as_dataset(X_gt)
+    X_syns = [as_dataset(X_syn) for X_syn in X_syns]
+    extra_syns = {
+        label: [as_dataset(X_syn) for X_syn in syns]
+        for label, syns in (extra_syns or {}).items()
+    }
+
     X_test = X_gt.test()
     d = X_test.unpack(as_numpy=True)[0].shape[1]
 
@@ -80,6 +104,10 @@ def predictive_experiment(
     if num_runs > 1 and verbose:
         print("Computing means and stds")
 
+    for label, syns in extra_syns.items():
+        if len(syns) < num_runs * n_models:
+            raise ValueError(f"extra_syns {label} has fewer datasets than X_syns")
+
     Ks = [20, 10, 5]
     y_DGE_approaches = ["DGE$_{" + str(K) + "}$" for K in Ks]
     y_naive_approaches = ["Naive (S)", "Naive (E)"]
@@ -88,6 +116,7 @@ def predictive_experiment(
         + y_naive_approaches
         + y_DGE_approaches[::-1]
         + ["DGE$_{20}$ (concat)"]
+        + ["DGE$_{20}$ (" + label + ")" for label in extra_syns]
     )
     y_preds = dict(zip(keys, [[] for _ in keys]))
     keys_for_plotting = ["Oracle", "Naive"] + y_DGE_approaches[::-1]
@@ -105,6 +134,7 @@ def predictive_experiment(
 
     for run in range(num_runs):
         run_label = f"run_{run}"
+        run_tags = set_profile_tags(dataset=getattr(X_gt, "dataset", None), run=run)
 
         # Oracle ensemble
 
@@ -132,6 +162,7 @@ def predictive_experiment(
                 load=load,
                 save=save,
                 filename="oracle",
+                plot_queue=plot_queue,
             )
 
         if run == 0 and plot:
@@ -171,6 +202,7 @@ def predictive_experiment(
                         save=save,
                         filename=f"naive_m{run}_",
                         baseline_contour=contour,
+                        plot_queue=plot_queue,
                     )
 
                 y_preds_for_plotting["Naive"] = y_pred_mean
@@ -206,6 +238,7 @@ def predictive_experiment(
                     save=save,
                     filename=f"DGE_K{K}_{run_label}_",
                     baseline_contour=contour,
+                    plot_queue=plot_queue,
                 )
 
             y_preds[approach].append(y_pred_mean)
@@ -215,16 +248,7 @@ def predictive_experiment(
                 y_preds_for_plotting[approach] = y_pred_mean
 
         # Data aggregated
-        X_syn_cat = pd.concat(
-            [
-                X_syns[i].dataframe()
-                for i in range(starting_dataset, starting_dataset + 20)
-            ],
-            axis=0,
-        )
-        X_syn_cat = GenericDataLoader(X_syn_cat, target_column="target")
-        X_syn_cat.targettype = X_syns[0].targettype
-        X_syn_cat = [X_syn_cat]
+        X_syn_cat = [cat_dl(X_syns[starting_dataset : starting_dataset + 20])]
         y_pred_mean, _, _ = aggregate(
             X_test,
             X_syn_cat,
@@ -253,54 +277,70 @@ def predictive_experiment(
                 save=save,
                 filename="concat_all",
                 baseline_contour=contour,
+                plot_queue=plot_queue,
             )
 
         y_preds["DGE$_{20}$ (concat)"].append(y_pred_mean)
 
+        # DGE with other synthetic datasets, cached in their own folder
+        for label, syns in extra_syns.items():
+            y_pred_mean, _, _ = aggregate(
+                X_test,
+                syns[starting_dataset : starting_dataset + n_models],
+                supervised_task,
+                models=None,
+                workspace_folder=os.path.join(workspace_folder, label),
+                task_type=task_type,
+                load=load,
+                save=save,
+                filename=f"DGE_{run_label}_",
+            )
+            y_preds["DGE$_{20}$ (" + label + ")"].append(y_pred_mean)
+
+        reset_profile_tags(run_tags)
+
     # Evaluation
     # Plotting
 
-    y_true = X_test.dataframe()["target"].values
+    y_true = X_test.unpack(as_numpy=True)[1]
 
     if X_syns[0].targettype == "classification" and plot:
         # Consider calibration of different approaches
-        fig = plt.figure(figsize=(3, 3), tight_layout=True, dpi=300)
+        calibration = {}
+        confidence_accuracy = {}
         for key, y_pred in y_preds_for_plotting.items():
-            print(key, y_pred.shape)
             prob_true, prob_pred = calibration_curve(y_true, y_pred, n_bins=10)
-            plt.plot(prob_pred, prob_true, label=key)
-
-        plt.xlabel = "Mean predicted probability"
-        plt.ylabel = "Fraction of positives"
-        plt.tight_layout()
-        plt.plot([0, 1], [0, 1], linestyle="--", label="Perfect calibration")
-        plt.legend()
-
-        if save:
-            filename = results_folder + "_calibration_curve.png"
-            fig.savefig(filename, dpi=300)
-
-        plt.show()
-        plt.close()
-
-        plt.figure(figsize=(3, 3), dpi=300)
-        for key, y_pred in y_preds_for_plotting.items():
-            thresholds, prob_true = accuracy_confidence_curve(y_true, y_pred, n_bins=20)
-            plt.plot(thresholds, prob_true, label=key)
-
-        plt.xlabel = r"Confidence threshold \tau"
-        plt.ylabel = r"Accuracy on examples \hat{y}"
-
-        plt.legend()
-        plt.tight_layout()
-        if save:
-            filename = results_folder + "_confidence_accuracy_curve.png"
-            plt.savefig(filename, dpi=200, bbox_inches="tight")
-
-        if plot:
-            plt.show()
+            calibration[key] = (prob_pred, prob_true)
+            confidence_accuracy[key] = accuracy_confidence_curve(
+                y_true, y_pred, n_bins=20
+            )
 
-        plt.close()
+        figures = [
+            (
+                "_calibration_curve.png",
+                calibration,
+                dict(
+                    xlabel="Mean predicted probability",
+                    ylabel="Fraction of positives",
+                    diagonal="Perfect calibration",
+                ),
+            ),
+            (
+                "_confidence_accuracy_curve.png",
+                confidence_accuracy,
+                dict(
+                    xlabel=r"Confidence threshold $\tau$",
+                    ylabel=r"Accuracy on examples $\hat{y}$",
+                    dpi=200,
+                ),
+            ),
+        ]
+        for suffix, curves, kwargs in figures:
+            path = results_folder + suffix if save else None
+            if plot_queue is None:
+                render_curves(path, curves, show=True, **kwargs)
+            elif save:
+                plot_queue.submit(render_curves, path, curves, **kwargs)
 
     # Compute metrics
 
@@ -314,6 +354,14 @@ def predictive_experiment(
             scores.append(compute_metrics(y_true, y_pred, X_test.targettype))
 
         scores = pd.concat(scores, axis=0)
+        if results_store is not None:
+            results_store.append(
+                scores.assign(run=np.arange(len(scores))),
+                experiment="predictive",
+                dataset=getattr(X_gt, "dataset", None),
+                approach=approach,
+                model_type=task_type,
+            )
         scores_mean[approach] = np.mean(scores, axis=0)
         scores_std[approach] = np.std(scores, axis=0)
         scores["Approach"] = approach
@@ -330,6 +378,215 @@ def predictive_experiment(
     return scores_mean, scores_std, scores_all
 
 
+def warm_start_experiment(
+    X_gt,
+    X_syns,
+    task_type="mlp",
+    K=20,
+    warm_iter=None,
+):
+    """Compares warm-started DGE members to members trained from scratch.
+
+    Args:
+        X_gt (GenericDataLoader): Real data, the test split is used for evaluation.
+        X_syns (List(GenericDataLoader)): List of synthetic datasets.
+        task_type (str, optional): Downstream model type. Defaults to "mlp".
+        K (int, optional): Number of DGE members. Defaults to 20.
+        warm_iter (int, optional): Iterations of the warm-started members, see
+            warm_start_fit.
+
+    Returns:
+        pd.DataFrame with the metrics of the DGE_K prediction on real test data, the
+        mean std across members and the wall time, for "cold" and "warm" starts.
+    """
+    X_gt = as_dataset(X_gt)
+    X_syns = [as_dataset(X_syn) for X_syn in X_syns[:K]]
+    X_test = X_gt.test()
+    X_test.targettype = X_gt.targettype
+    y_true = X_test.unpack(as_numpy=True)[1]
+
+    scores_all = []
+    for mode in ["cold", "warm"]:
+        start = time.perf_counter()
+        y_pred_mean, y_pred_std, _ = aggregate(
+            X_test,
+            X_syns[:K],
+            supervised_task,
+            models=None,
+            task_type=task_type,
+            load=False,
+            save=False,
+            warm_start=mode == "warm",
+            warm_iter=warm_iter,
+        )
+        seconds = time.perf_counter() - start
+
+        scores = compute_metrics(y_true, y_pred_mean, X_test.targettype)
+        scores["Mean std"] = np.mean(y_pred_std)
+        scores["Time (s)"] = seconds
+        scores.index = [mode]
+        scores_all.append(scores)
+
+    return pd.concat(scores_all, axis=0)
+
+
+def adaptive_experiment(
+    X_gt,
+    X_syns,
+    task_type="mlp",
+    workspace_folder="workspace",
+    max_members=20,
+    min_members=3,
+    tol=1e-3,
+    patience=2,
+    load=True,
+    save=True,
+    verbose=False,
+    results_store=None,
+):
+    """DGE with as many members as it takes for the predictions to converge.
+
+    Args:
+        X_gt (GenericDataLoader): Real data, the test split is used for evaluation.
+        X_syns (Iterable(GenericDataLoader)): Synthetic datasets, e.g. the lazy
+            iter_synthetic_data, so that generators are only trained when needed.
+        max_members, min_members, tol, patience: See aggregate_adaptive.
+        results_store (ResultsStore, optional): Append the scores, see DGE_results.
+
+    Returns:
+        pd.DataFrame with the metrics of the adaptive DGE prediction on real test data,
+        the number of members K and the mean std across members, and the history of
+        aggregate_adaptive
+    """
+    X_gt = as_dataset(X_gt)
+    X_test = X_gt.test()
+    X_test.targettype = X_gt.targettype
+    y_true = X_test.unpack(as_numpy=True)[1]
+
+    # the members are those of DGE run 0 in predictive_experiment
+    y_pred_mean, y_pred_std, models, history = aggregate_adaptive(
+        X_test,
+        X_syns,
+        supervised_task,
+        task_type=task_type,
+        max_members=max_members,
+        min_members=min_members,
+        tol=tol,
+        patience=patience,
+        load=load,
+        save=save,
+        workspace_folder=workspace_folder,
+        filename="DGE_run_0_",
+        verbose=verbose,
+    )
+
+    scores = compute_metrics(y_true, y_pred_mean, X_test.targettype)
+    scores["K"] = len(models)
+    scores["Mean std"] = np.mean(y_pred_std)
+    scores.index = ["DGE (adaptive)"]
+
+    if results_store is not None:
+        results_store.append(
+            scores.assign(approach=scores.index),
+            experiment="adaptive",
+            dataset=getattr(X_gt, "dataset", None),
+            model_type=task_type,
+        )
+
+    return scores, history
+
+
+def generation_strategy_experiment(
+    X_gt,
+    model_name,
+    strategies=("independent", "shared_fit_5", "bagging_0.5"),
+    K=20,
+    nsyn=None,
+    task_type="mlp",
+    data_folder=None,
+    workspace_folder="workspace",
+    load_syn=False,
+    load=True,
+    save=True,
+    verbose=False,
+    results_store=None,
+):
+    """Compares generation strategies of the synthetic datasets, see DGE_data.
+
+    Args:
+        X_gt (GenericDataLoader): Real data, e.g. of get_real_and_synthetic. The train
+            split is used to fit the generators, the test split for evaluation.
+        model_name (str): Generator, see make_generator.
+        strategies (Iterable(str)): Generation strategies, see STRATEGIES.
+        K (int, optional): Number of DGE members. Defaults to 20.
+        nsyn (int, optional): Rows per synthetic dataset. Defaults to the number of
+            training rows.
+        load_syn (bool, optional): Load cached synthetic data, which makes the
+            generation times meaningless. Defaults to False.
+        load (bool, optional): Load cached downstream models. Defaults to True.
+
+    Returns:
+        pd.DataFrame with the metrics of the DGE_K prediction on real test data, the
+        mean std across members and the wall time of generating the K datasets, per
+        strategy
+    """
+    if data_folder is None:
+        data_folder = os.path.join("synthetic_data", X_gt.dataset, model_name)
+    if nsyn is None:
+        nsyn = X_gt.train().shape[0]
+
+    X_test = as_dataset(X_gt).test()
+    X_test.targettype = X_gt.targettype
+    y_true = X_test.unpack(as_numpy=True)[1]
+
+    scores_all = []
+    for strategy in strategies:
+        start = time.perf_counter()
+        X_syns = list(
+            iter_synthetic_data(
+                X_gt,
+                model_name,
+                K,
+                nsyn,
+                data_folder,
+                load_syn=load_syn,
+                save=save,
+                verbose=verbose,
+                strategy=strategy,
+            )
+        )
+        seconds = time.perf_counter() - start
+
+        y_pred_mean, y_pred_std, _ = aggregate(
+            X_test,
+            [as_dataset(X_syn) for X_syn in X_syns],
+            supervised_task,
+            models=None,
+            workspace_folder=os.path.join(workspace_folder, strategy),
+            task_type=task_type,
+            load=load,
+            save=save,
+            filename=f"DGE_K{K}_",
+        )
+
+        scores = compute_metrics(y_true, y_pred_mean, X_test.targettype)
+        scores["Mean std"] = np.mean(y_pred_std)
+        scores["Generation time (s)"] = seconds
+        scores.index = [strategy]
+        scores_all.append(scores)
+
+    scores_all = pd.concat(scores_all, axis=0)
+    if results_store is not None:
+        results_store.append(
+            scores_all.assign(approach=scores_all.index),
+            experiment="generation_strategy",
+            dataset=getattr(X_gt, "dataset", None),
+            generator=model_name,
+            model_type=task_type,
+        )
+    return scores_all
+
+
 ##############################################################################################################
 
 # Model evaluation and selection experiments
@@ -345,6 +602,7 @@ def model_evaluation_experiment(
     save=True,
     outlier=False,
     verbose=False,
+    results_store=None,
 ):
     means = []
     stds = []
@@ -358,6 +616,8 @@ def model_evaluation_experiment(
     else:
         subset = None
     folder = os.path.join(workspace_folder, "Naive")
+    X_gt = as_dataset(X_gt)
+    X_syns = [as_dataset(X_syn) for X_syn in X_syns]
 
     for i, approach in enumerate(approaches):
         if verbose:
@@ -381,6 +641,14 @@ def model_evaluation_experiment(
         all["Approach"] = approach
         res[approach] = all
 
+        if results_store is not None:
+            results_store.append(
+                all.assign(member=np.arange(len(all))),
+                experiment="model_evaluation" + (f"_{relative}" if relative else ""),
+                dataset=getattr(X_gt, "dataset", None),
+                model_type=model_type,
+            )
+
     means = pd.concat(means, axis=0)
     stds = pd.concat(stds, axis=0)
     res = pd.concat(res, axis=0)
@@ -404,6 +672,7 @@ def model_selection_experiment(
     save=True,
     outlier=False,
     model_types=None,
+    results_store=None,
 ):
     if model_types is None:
         model_types = ["lr", "mlp", "deep_mlp", "rf", "knn", "svm", "xgboost"]
@@ -412,6 +681,8 @@ def model_selection_experiment(
     all_means = []
     output_means = {}
     output_stds = {}
+    X_gt = as_dataset(X_gt)
+    X_syns = [as_dataset(X_syn) for X_syn in X_syns]
 
     for i, model_type in enumerate(model_types):
         mean, std, _ = model_evaluation_experiment(
@@ -423,6 +694,7 @@ def model_selection_experiment(
             load=load,
             save=save,
             outlier=outlier,
+            results_store=results_store,
         )
         all_means.append(mean)
         all_stds.append(std)
@@ -468,6 +740,7 @@ def cross_val(
     task_type="mlp",
     cross_fold=5,
     verbose=False,
+    results_store=None,
 ):
     """Compares predictions by different approaches using cross validation.
 
@@ -485,6 +758,8 @@ def cross_val(
     if save and results_folder is None:
         raise ValueError("results_folder must be specified when save=True.")
 
+    X_gt = as_dataset(X_gt)
+    X_syns = [as_dataset(X_syn) for X_syn in X_syns]
     X_test_r = X_gt.test()
 
     X_test_r.targettype = X_gt.targettype
@@ -539,6 +814,21 @@ def cross_val(
 
             scores_s[approach] = [0] * cross_fold
             scores_r[approach] = [0] * cross_fold
+            approach_tags = set_profile_tags(
+                dataset=getattr(X_gt, "dataset", None), approach=approach, run=run
+            )
+
+            # the models of all splits are cached in one bundle, see DGE_artifacts
+            fileroot = os.path.join(
+                workspace_folder, f"cross_validation_{task_type}_{approach}_{run_label}"
+            )
+            store = ModelStore(
+                f"{fileroot}.dge",
+                legacy_filename=lambda i: f"{fileroot}_split_{i}.pkl",
+            )
+            if load:
+                # load the next splits' models while the current one is evaluated
+                store.prefetch(range(cross_fold))
             for i, (train_index, test_index) in enumerate(kf.split(X_syn_run)):
                 if verbose:
                     print("Run", run, "approach", approach, "split", i)
@@ -547,31 +837,16 @@ def cross_val(
                     X_train = cat_dl([X_syn_run[i] for i in train_index])
                     X_test_s = cat_dl([X_syn_run[i] for i in test_index])
                 else:
-                    if type(X_syn_run) == pd.DataFrame:
-                        pass
-                    else:
-                        X_syn_run = X_syn_run.dataframe()
-
-                    x_train, x_test = (
-                        X_syn_run.loc[train_index],
-                        X_syn_run.loc[test_index],
-                    )
-                    X_train = GenericDataLoader(x_train, target_column="target")
-                    X_test_s = GenericDataLoader(x_test, target_column="target")
+                    X_train = X_syn_run.rows(train_index)
+                    X_test_s = X_syn_run.rows(test_index)
 
                 X_test_s.targettype = X_syns[0].targettype
                 X_train.targettype = X_syns[0].targettype
 
-                filename = os.path.join(
-                    workspace_folder,
-                    f"cross_validation_{task_type}_{approach}_{run_label}_split_{i}.pkl",
-                )
-
-                if load and os.path.exists(filename):
-                    with open(filename, "rb") as f:
-                        model = pickle.load(f)
+                model = store.get(i) if load else None
+                stored = model is not None
 
-                elif load and approach == "DGE$_{20}$":
+                if model is None and load and approach == "DGE$_{20}$":
                     # for compatibility with old files
                     alt_filename = os.path.join(
                         workspace_folder,
@@ -580,13 +855,8 @@ def cross_val(
                         + f"_{run_label}_split_{i}.pkl",
                     )
                     if os.path.exists(alt_filename):
-                        with open(alt_filename, "rb") as f:
-                            model = pickle.load(f)
-                    else:
-                        model = None
+                        model = DGE_serialization.load(alt_filename)
 
-                else:
-                    model = None
                 scores_s[approach][i], model = tt_predict_performance(
                     X_test_s,
                     X_train,
@@ -594,6 +864,7 @@ def cross_val(
                     model_type=task_type,
                     subset=None,
                     verbose=False,
+                    random_state=derive_seed(path_key(fileroot), i),
                 )
                 scores_r[approach][i], _ = tt_predict_performance(
                     X_test_r,
@@ -611,14 +882,29 @@ def cross_val(
                 scores_s[approach][i]["approach"] = approach
                 scores_r[approach][i]["approach"] = approach
 
-                if save and not os.path.exists(filename):
-                    Path(filename).parent.mkdir(parents=True, exist_ok=True)
-                    with open(filename, "wb") as f:
-                        pickle.dump(model, f)
+                if save and not stored:
+                    store.put(i, model)
+
+            if save:
+                store.flush()
+            store.close()
+            reset_profile_tags(approach_tags)
 
             scores_s[approach] = pd.concat(scores_s[approach], axis=0)
             scores_r[approach] = pd.concat(scores_r[approach], axis=0)
 
+            if results_store is not None:
+                for experiment, scores in [
+                    ("cross_val_synthetic", scores_s[approach]),
+                    ("cross_val_real", scores_r[approach]),
+                ]:
+                    results_store.append(
+                        scores,
+                        experiment=experiment,
+                        dataset=getattr(X_gt, "dataset", None),
+                        model_type=task_type,
+                    )
+
         scores_s_all.append(pd.concat(scores_s))
         scores_r_all.append(pd.concat(scores_r))
 
@@ -0,0 +1,62 @@
+# stdlib
+from functools import lru_cache
+
+# Generators are synthcity plugins, optionally with an architecture preset given as a
+# suffix of the model name, e.g. "ctgan_deep" is ctgan with the "deep" preset. Add
+# presets with register_preset, or whole named generators with register_generator.
+GENERATOR_PRESETS = {
+    "deep": {"discriminator_n_layers_hidden": 3, "generator_n_layers_hidden": 3},
+    "shallow": {"discriminator_n_layers_hidden": 1, "generator_n_layers_hidden": 1},
+    "smallest": {
+        "discriminator_n_layers_hidden": 1,
+        "generator_n_layers_hidden": 1,
+        "generator_n_units_hidden": 100,
+        "discriminator_n_units_hidden": 100,
+    },
+}
+
+# name -> (plugin, params), takes precedence over presets
+GENERATORS = {}
+
+
+def register_preset(name, **params):
+    """Make "<plugin>_<name>" the plugin with params, e.g. register_preset("wide",
+    generator_n_units_hidden=500)"""
+    GENERATOR_PRESETS[name] = params
+
+
+def register_generator(name, plugin, **params):
+    """Make name the synthcity plugin with params"""
+    GENERATORS[name] = (plugin, params)
+
+
+@lru_cache(maxsize=None)
+def plugins(categories=None):
+    """The synthcity plugin registry, discovered once per process. categories is a
+    tuple, e.g. ("generic",), or None for synthcity's default"""
+    # synthcity absolute
+    from synthcity.plugins import Plugins
+
+    if categories is None:
+        return Plugins()
+    return Plugins(categories=list(categories))
+
+
+def resolve_generator(model_name):
+    """(plugin, params) of model_name"""
+    if model_name in GENERATORS:
+        plugin, params = GENERATORS[model_name]
+        return plugin, dict(params)
+    plugin, _, preset = model_name.rpartition("_")
+    if plugin and preset in GENERATOR_PRESETS:
+        return plugin, dict(GENERATOR_PRESETS[preset])
+    return model_name, {}
+
+
+def make_generator(model_name, random_state=None, **params):
+    """A new, unfitted generator model_name, params override those of its preset"""
+    plugin, preset_params = resolve_generator(model_name)
+    params = {**preset_params, **params}
+    if random_state is not None:
+        params["random_state"] = random_state
+    return plugins().get(plugin, **params)
@@ -0,0 +1,146 @@
+# stdlib
+from concurrent.futures import ProcessPoolExecutor
+
+# Figures are rendered from plotting data emitted by the experiments, either inline
+# (the default, figures are shown) or deferred through a PlotQueue, which renders them
+# in background processes with the non-interactive Agg backend.
+
+
+def _pyplot(show):
+    # third party
+    import matplotlib
+
+    if not show:
+        matplotlib.use("Agg")
+    # third party
+    import matplotlib.pyplot as plt
+
+    return plt
+
+
+def _finish(plt, fig, path, show, **savefig_kwargs):
+    if path is not None:
+        print(f"Saving {path}")
+        fig.savefig(path, **savefig_kwargs)
+    if show:
+        plt.show()
+    plt.close(fig)
+    return path
+
+
+def render_imshow(
+    path, grid, y, contour, extent, oracle=False, baseline_contour=None, show=False
+):
+    """Image of the predictions y on the grid of aggregate_imshow, with the decision
+    boundary of contour and of the baseline contour"""
+    # third party
+    from mpl_toolkits.axes_grid1 import make_axes_locatable
+
+    plt = _pyplot(show)
+    X_grid, Y_grid = grid
+    steps = X_grid.shape[0]
+
+    fig = plt.figure(figsize=(3, 2.5), dpi=300, tight_layout=True)
+    ax = plt.axes()
+    if oracle:
+        ax.contour(X_grid, Y_grid, contour[2], levels=[0.5], colors="w", linestyles=":")
+    else:
+        ax.contour(
+            X_grid, Y_grid, contour[2], levels=[0.5], colors="r", linestyles="--"
+        )
+
+    if baseline_contour is not None:
+        ax.contour(
+            baseline_contour[0],
+            baseline_contour[1],
+            baseline_contour[2],
+            levels=[0.5],
+            colors="w",
+            linestyles=":",
+        )
+
+    im = ax.imshow(
+        y.reshape(steps, steps),
+        cmap="viridis",
+        extent=extent,
+        origin="lower",
+    )
+    ax.set_aspect("equal", "box")
+
+    divider = make_axes_locatable(ax)
+    cax = divider.append_axes("right", size="5%", pad=0.05)
+    plt.colorbar(im, cax=cax)
+    return _finish(plt, fig, path, show, bbox_inches="tight")
+
+
+def render_samples(path, X_train, y_train, extent, show=False):
+    """Scatter plot of the training data of a binary task"""
+    plt = _pyplot(show)
+    fig = plt.figure(figsize=(3, 2.5), dpi=300, tight_layout=True)
+    ax = plt.axes()
+    ax.set_aspect("equal", "box")
+    ax.set_xlim(extent[0], extent[1])
+    ax.set_ylim(extent[2], extent[3])
+    ax.scatter(X_train[:, 0], X_train[:, 1], c=y_train.astype(bool), marker=".")
+    return _finish(plt, fig, path, show, bbox_inches="tight")
+
+
+def render_curves(
+    path, curves, xlabel="", ylabel="", diagonal=None, dpi=300, show=False
+):
+    """Line plot of curves, a dict label -> (x, y), e.g. calibration curves"""
+    plt = _pyplot(show)
+    fig = plt.figure(figsize=(3, 3), dpi=300, tight_layout=True)
+    ax = plt.axes()
+    for label, (x, y) in curves.items():
+        ax.plot(x, y, label=label)
+    if diagonal is not None:
+        ax.plot([0, 1], [0, 1], linestyle="--", label=diagonal)
+    ax.set_xlabel(xlabel)
+    ax.set_ylabel(ylabel)
+    ax.legend()
+    return _finish(plt, fig, path, show, dpi=dpi, bbox_inches="tight")
+
+
+def _init_worker():
+    # third party
+    import matplotlib
+
+    matplotlib.use("Agg")
+
+
+class PlotQueue:
+    """Renders figures in a pool of background processes with the Agg backend.
+
+    Experiments given a plot_queue submit their plotting data instead of rendering
+    inline, so compute never waits for matplotlib. Figures are written to disk only,
+    call wait (or leave the with block) to make sure all of them are.
+    """
+
+    def __init__(self, max_workers=2):
+        self.executor = ProcessPoolExecutor(
+            max_workers=max_workers, initializer=_init_worker
+        )
+        self.futures = []
+
+    def submit(self, render, *args, **kwargs):
+        kwargs["show"] = False
+        self.futures.append(self.executor.submit(render, *args, **kwargs))
+
+    def wait(self):
+        """Block until all submitted figures are rendered, returns their paths"""
+        paths = [future.result() for future in self.futures]
+        self.futures = []
+        return paths
+
+    def close(self):
+        try:
+            self.wait()
+        finally:
+            self.executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -0,0 +1,213 @@
+# stdlib
+import contextlib
+import contextvars
+import functools
+import json
+import os
+import sys
+import threading
+import time
+
+try:
+    # stdlib
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Profiling is off unless the DGE_PROFILE environment variable is set, or
+# enable_profiling is called. When off, profile_stage and profile_tags return a shared
+# no-op context manager, so instrumented code only pays for one flag check.
+ENABLED = os.environ.get("DGE_PROFILE", "") not in ["", "0"]
+
+EVENTS = []
+_EVENTS_LOCK = threading.Lock()
+_NULL = contextlib.nullcontext()
+_TAGS = contextvars.ContextVar("dge_profile_tags", default={})
+
+
+def enable_profiling(enabled=True):
+    global ENABLED
+    ENABLED = enabled
+
+
+def reset_profile():
+    with _EVENTS_LOCK:
+        EVENTS.clear()
+
+
+def _io_bytes():
+    """Bytes read and written by this process, from /proc/self/io (Linux only)"""
+    try:
+        with open("/proc/self/io") as f:
+            counters = dict(line.split(": ") for line in f.read().splitlines())
+        return int(counters["rchar"]), int(counters["wchar"])
+    except (OSError, KeyError, ValueError):
+        return 0, 0
+
+
+def _peak_rss_mb():
+    """High-water mark of the resident memory of the whole process so far, None where
+    the resource module is unavailable"""
+    if resource is None:
+        return None
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return maxrss / 2**20 if sys.platform == "darwin" else maxrss / 1024
+
+
+class _Stage:
+    def __init__(self, stage, tags):
+        self.stage = stage
+        self.tags = tags
+
+    def __enter__(self):
+        self.peak_rss = _peak_rss_mb()
+        self.read, self.written = _io_bytes()
+        self.cpu = time.process_time()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        wall = time.perf_counter() - self.start
+        cpu = time.process_time() - self.cpu
+        read, written = _io_bytes()
+        peak_rss = _peak_rss_mb()
+        event = {
+            "stage": self.stage,
+            "start": self.start,
+            "wall": wall,
+            "cpu": cpu,
+            # the process peak is not reset per stage, but how much a stage raised it
+            # is attributable to the stage (or to threads running alongside it)
+            "process_peak_rss_mb": peak_rss,
+            "peak_rss_growth_mb": (
+                peak_rss - self.peak_rss if peak_rss is not None else None
+            ),
+            "read_bytes": read - self.read,
+            "write_bytes": written - self.written,
+            "thread": threading.get_ident(),
+            **_TAGS.get(),
+            **self.tags,
+        }
+        with _EVENTS_LOCK:
+            EVENTS.append(event)
+
+
+@contextlib.contextmanager
+def _tagged(tags):
+    token = _TAGS.set({**_TAGS.get(), **tags})
+    try:
+        yield
+    finally:
+        _TAGS.reset(token)
+
+
+def profile_tags(**tags):
+    """Tag all stages profiled in this context, e.g. with dataset, approach, run, K"""
+    if not ENABLED:
+        return _NULL
+    return _tagged(tags)
+
+
+def set_profile_tags(**tags):
+    """Tag all stages profiled from now on in this context, until reset_profile_tags is
+    called with the returned token. For loops whose body is too long for profile_tags"""
+    if not ENABLED:
+        return None
+    return _TAGS.set({**_TAGS.get(), **tags})
+
+
+def reset_profile_tags(token):
+    if token is not None:
+        _TAGS.reset(token)
+
+
+def profile_stage(stage, **tags):
+    """Record wall time, CPU time, I/O bytes of the enclosed code, and the process peak
+    RSS and how much the code raised it"""
+    if not ENABLED:
+        return _NULL
+    return _Stage(stage, tags)
+
+
+def profiled(stage):
+    """Decorator version of profile_stage"""
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not ENABLED:
+                return func(*args, **kwargs)
+            with _Stage(stage, {}):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def profile_events():
+    """All recorded stages as a DataFrame, one row per stage"""
+    # third party
+    import pandas as pd
+
+    with _EVENTS_LOCK:
+        return pd.DataFrame(list(EVENTS))
+
+
+def profile_summary(by=("stage",)):
+    """Total and mean wall and CPU time, I/O, process peak RSS and the largest raise of
+    it per stage (and tags in by)"""
+    events = profile_events()
+    if len(events) == 0:
+        return events
+    return (
+        events.groupby(list(by))
+        .agg(
+            calls=("wall", "count"),
+            wall=("wall", "sum"),
+            mean_wall=("wall", "mean"),
+            cpu=("cpu", "sum"),
+            read_bytes=("read_bytes", "sum"),
+            write_bytes=("write_bytes", "sum"),
+            process_peak_rss_mb=("process_peak_rss_mb", "max"),
+            peak_rss_growth_mb=("peak_rss_growth_mb", "max"),
+        )
+        .sort_values("wall", ascending=False)
+    )
+
+
+def export_json(path):
+    with _EVENTS_LOCK:
+        events = list(EVENTS)
+    with open(path, "w") as f:
+        json.dump(events, f, indent=1, default=str)
+
+
+def export_chrome_trace(path):
+    """Write the stages in the Chrome trace format, for chrome://tracing or Perfetto"""
+    with _EVENTS_LOCK:
+        events = list(EVENTS)
+
+    pid = os.getpid()
+    trace = []
+    for event in events:
+        args = {
+            key: value
+            for key, value in event.items()
+            if key not in ["stage", "start", "wall", "thread"]
+        }
+        trace.append(
+            {
+                "name": event["stage"],
+                "ph": "X",
+                "ts": event["start"] * 1e6,
+                "dur": event["wall"] * 1e6,
+                "pid": pid,
+                "tid": event["thread"],
+                "args": args,
+            }
+        )
+
+    with open(path, "w") as f:
+        json.dump({"traceEvents": trace}, f, default=str)
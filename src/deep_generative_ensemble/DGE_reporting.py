@@ -0,0 +1,117 @@
+from deep_generative_ensemble.DGE_results import ResultsStore
+
+# third party
+import numpy as np
+import pandas as pd
+
+# metrics for which a lower score is better, all others are maximised
+LOWER_IS_BETTER = ["NLL", "Brier", "RMSE", "MAE"]
+
+# datasets in the order and with the names of the tables in the paper
+DATASET_NAMES = {
+    "moons": "Moons",
+    "circles": "Circles",
+    "adult": "Adult Income",
+    "breast_cancer": "Breast Cancer",
+    "seer": "SEER",
+    "covid": "COVID-19",
+}
+
+
+def to_long(results, name="dataset", experiment=None):
+    """Scores in long format, one row per (name, approach, metric) and a value column.
+
+    results is a dict name -> wide scores (one row per approach, one column per
+    metric), a ResultsStore, or a long DataFrame already.
+    """
+    if isinstance(results, ResultsStore):
+        filters = {} if experiment is None else {"experiment": experiment}
+        return results.query(**filters)
+    if isinstance(results, pd.DataFrame):
+        return results
+
+    wide = pd.concat(results, names=[name, "approach"]).select_dtypes("number")
+    long = wide.stack().reset_index()
+    long.columns = [name, "approach", "metric", "value"]
+    return long
+
+
+def summarize(results, by=("approach",), across="dataset", ci=0.95, experiment=None):
+    """Mean, std, confidence interval and mean rank of every metric across datasets.
+
+    Scores are averaged per dataset first (e.g. over runs), so that every dataset
+    counts once. Ranks are taken per dataset and metric, 1 being the best.
+
+    Returns:
+        pd.DataFrame indexed by by + ["metric"], with columns mean, std, n, rank,
+        ci_low and ci_high
+    """
+    # third party
+    from scipy import stats
+
+    by = list(by)
+    long = to_long(results, across, experiment)
+    per_dataset = (
+        long.groupby([across] + by + ["metric"], sort=False)["value"]
+        .mean()
+        .reset_index()
+    )
+
+    sign = np.where(per_dataset["metric"].isin(LOWER_IS_BETTER), 1, -1)
+    per_dataset["rank"] = (
+        (per_dataset["value"] * sign)
+        .groupby([per_dataset[across], per_dataset["metric"]])
+        .rank(method="average")
+    )
+
+    summary = per_dataset.groupby(by + ["metric"], sort=False).agg(
+        mean=("value", "mean"),
+        std=("value", "std"),
+        n=("value", "count"),
+        rank=("rank", "mean"),
+    )
+    t = stats.t.ppf((1 + ci) / 2, df=np.maximum(summary["n"] - 1, 1))
+    half_width = t * summary["std"].fillna(0) / np.sqrt(summary["n"])
+    summary["ci_low"] = summary["mean"] - half_width
+    summary["ci_high"] = summary["mean"] + half_width
+    return summary
+
+
+def table(summary, stat="mean"):
+    """One statistic of summarize as a table, one column per metric, in the order the
+    approaches and metrics first appeared"""
+    frame = summary[stat].unstack("metric")
+    index = summary.index.droplevel("metric").unique()
+    columns = summary.index.get_level_values("metric").unique()
+    return frame.reindex(index=index, columns=columns)
+
+
+def metric_table(results, metric, index="approach", columns="dataset", experiment=None):
+    """Mean of one metric per approach (rows) and dataset (columns), with the known
+    datasets first and renamed as in the paper, and a Mean column"""
+    long = to_long(results, columns, experiment)
+    long = long[long["metric"] == metric]
+    frame = long.pivot_table(
+        values="value", index=index, columns=columns, aggfunc="mean", sort=False
+    )
+
+    known = [dataset for dataset in DATASET_NAMES if dataset in frame.columns]
+    frame = frame[known + [c for c in frame.columns if c not in DATASET_NAMES]]
+    frame = frame.rename(columns=DATASET_NAMES)
+    frame.columns = list(frame.columns)
+    frame["Mean"] = frame.mean(axis=1)
+    return frame
+
+
+def format_mean_std(mean, std, precision=3):
+    """'mean ± std' strings for all cells of mean that have a std"""
+    columns = mean.columns.intersection(std.columns)
+    formatted = mean.round(precision).astype(str)
+    formatted[columns] = (
+        formatted[columns] + " ± " + std[columns].round(precision).astype(str)
+    )
+    return formatted
+
+
+def to_latex(frame, precision=3):
+    return frame.to_latex(float_format=lambda x: f"%.{precision}f" % x)
@@ -0,0 +1,131 @@
+# stdlib
+import os
+import sqlite3
+import threading
+import time
+
+# third party
+import pandas as pd
+
+# Every score is one row (long format), keyed by the configuration it belongs to. Keys
+# that do not apply to an experiment, e.g. split outside cross_val, are NULL.
+KEYS = [
+    "dataset",
+    "generator",
+    "max_n",
+    "nsyn",
+    "run",
+    "split",
+    "member",
+    "approach",
+    "model_type",
+    "experiment",
+]
+COLUMNS = KEYS + ["metric", "value", "created"]
+
+
+class ResultsStore:
+    """Append-only store of experiment scores in an SQLite file.
+
+    Keys given to the constructor (or with_keys) are added to every appended score,
+    e.g. ResultsStore(dataset="moons", generator="ctgan", max_n=2000, nsyn=2000).
+    """
+
+    def __init__(self, path=os.path.join("results", "results.sqlite"), **keys):
+        self.path = path
+        self.keys = keys
+        self.lock = threading.Lock()
+        # views made by with_keys share the connection, which only the store closes
+        self.owner = True
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        columns = ", ".join(
+            f"{column} REAL" if column in ["value", "created"] else column
+            for column in COLUMNS
+        )
+        self.conn.execute(f"CREATE TABLE IF NOT EXISTS results ({columns})")
+        self.conn.execute(
+            "CREATE INDEX IF NOT EXISTS results_config "
+            "ON results (experiment, metric, dataset, approach)"
+        )
+        self.conn.commit()
+
+    def with_keys(self, **keys):
+        """A view of the same store that adds keys to every appended score"""
+        store = ResultsStore.__new__(ResultsStore)
+        store.__dict__.update(self.__dict__)
+        store.keys = {**self.keys, **keys}
+        store.owner = False
+        return store
+
+    def close(self):
+        """Close the connection, closing a view leaves its store open"""
+        if self.owner:
+            self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def append(self, scores, **keys):
+        """Append scores, a DataFrame with one column per metric.
+
+        Columns of scores named like a key (in any case, e.g. "Approach") give that key
+        per row. Other keys are taken from keys, then from the keys of the store.
+        """
+        keys = {**self.keys, **{k: v for k, v in keys.items() if v is not None}}
+        scores = scores.rename(
+            columns={c: c.lower() for c in scores.columns if str(c).lower() in KEYS}
+        )
+        id_vars = [key for key in KEYS if key in scores.columns]
+        long = scores.melt(id_vars=id_vars, var_name="metric", value_name="value")
+        for key in KEYS:
+            if key not in long.columns:
+                long[key] = keys.get(key)
+        long["created"] = time.time()
+
+        # sqlite only takes python scalars
+        long = long[COLUMNS].astype(object)
+        long = long.where(long.notna(), None)
+        with self.lock:
+            self.conn.executemany(
+                f"INSERT INTO results VALUES ({', '.join('?' * len(COLUMNS))})",
+                long.itertuples(index=False, name=None),
+            )
+            self.conn.commit()
+
+    def query(self, **filters):
+        """Scores matching filters, key=value or key=[values], in the order appended"""
+        where = []
+        params = []
+        for key, value in filters.items():
+            if key not in COLUMNS:
+                raise ValueError(f"Unknown key {key}, choose from {COLUMNS}")
+            values = value if isinstance(value, (list, tuple)) else [value]
+            where.append(f"{key} IN ({', '.join('?' * len(values))})")
+            params += values
+
+        sql = "SELECT * FROM results"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        with self.lock:
+            return pd.read_sql(sql + " ORDER BY rowid", self.conn, params=params)
+
+    def aggregate(self, by=("approach",), func="mean", **filters):
+        """Scores aggregated over everything not in by, one column per metric"""
+        by = list(by)
+        scores = self.query(**filters)
+        return (
+            scores.groupby(by + ["metric"], sort=False, dropna=False)["value"]
+            .agg(func)
+            .unstack("metric")
+        )
+
+    def pivot(self, metric, index="approach", columns="dataset", **filters):
+        """Mean of one metric, e.g. per approach (rows) and dataset (columns)"""
+        scores = self.query(metric=metric, **filters)
+        return scores.pivot_table(
+            values="value", index=index, columns=columns, aggfunc="mean", sort=False
+        )
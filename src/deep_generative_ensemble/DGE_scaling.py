@@ -0,0 +1,198 @@
+# stdlib
+import itertools
+import time
+import tracemalloc
+
+from deep_generative_ensemble.DGE_benchmarks import GaussianGenerator
+from deep_generative_ensemble.DGE_data import load_real_data
+from deep_generative_ensemble.DGE_generators import make_generator
+from deep_generative_ensemble.DGE_utils import init_model
+
+# third party
+import numpy as np
+import pandas as pd
+
+STAGES = ["generation", "training", "inference"]
+DIMENSIONS = ["K", "max_n", "nsyn"]
+
+
+def _generator(generator, seed):
+    if generator == "stub":
+        return GaussianGenerator(seed)
+    return make_generator(generator, random_state=seed)
+
+
+def _generate(generator, X_train, nsyn, seed):
+    syn_model = _generator(generator, seed)
+    syn_model.fit(X_train)
+    X_syn = syn_model.generate(count=nsyn)
+    if not isinstance(X_syn, pd.DataFrame):
+        X_syn = X_syn.dataframe()
+    return X_syn
+
+
+def _run_stages(X_gt, K, nsyn, generator, model_type):
+    """Run the K generations, trainings and the inference once, returns the seconds
+    spent in every stage"""
+    X_train = X_gt.train()
+    x_test = X_gt.test().unpack(as_numpy=True)[0]
+
+    timings = dict.fromkeys(STAGES, 0.0)
+    models = []
+    for k in range(K):
+        start = time.perf_counter()
+        X_syn = _generate(generator, X_train, nsyn, seed=k)
+        timings["generation"] += time.perf_counter() - start
+
+        start = time.perf_counter()
+        y = X_syn["target"].values
+        model = init_model(model_type, X_gt.targettype)
+        model.fit(X_syn.drop(columns="target").values, y)
+        models.append(model)
+        timings["training"] += time.perf_counter() - start
+
+    start = time.perf_counter()
+    for model in models:
+        if X_gt.targettype == "regression":
+            model.predict(x_test)
+        else:
+            model.predict_proba(x_test)
+    timings["inference"] += time.perf_counter() - start
+    return timings
+
+
+def measure_config(
+    dataset, K, max_n, nsyn, generator="stub", model_type="mlp", p_train=0.8
+):
+    """Seconds spent generating K synthetic datasets, training K downstream models on
+    them and predicting the test set with all K, and the peak traced memory (MB).
+
+    As in DGE_benchmarks.measure, the stages are timed without tracing, which slows
+    down allocations, and the peak memory is traced in a second run.
+    """
+    X_gt = load_real_data(dataset, p_train=p_train, max_n=max_n)
+    timings = _run_stages(X_gt, K, nsyn, generator, model_type)
+
+    tracemalloc.start()
+    try:
+        _run_stages(X_gt, K, nsyn, generator, model_type)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {**timings, "peak_mb": peak / 2**20}
+
+
+def scaling_sweep(
+    dataset="moons",
+    Ks=(2, 5, 10),
+    max_ns=(500, 1000, 2000),
+    nsyns=(500, 1000, 2000),
+    generator="stub",
+    model_type="mlp",
+    verbose=False,
+):
+    """Measure the cost of every combination of K, max_n and nsyn.
+
+    generator is "stub" for a Gaussian stand-in, or the name of a (cheap) synthcity
+    plugin, e.g. "marginal_distributions", so the sweep runs offline.
+    """
+    results = []
+    for K, max_n, nsyn in itertools.product(Ks, max_ns, nsyns):
+        result = measure_config(dataset, K, max_n, nsyn, generator, model_type)
+        if verbose:
+            print(f"K={K} max_n={max_n} nsyn={nsyn}: {result}")
+        results.append({"K": K, "max_n": max_n, "nsyn": nsyn, **result})
+    return pd.DataFrame(results)
+
+
+def fit_cost_model(sweep, targets=STAGES + ["peak_mb"]):
+    """Fit a power law cost = c * K^a * max_n^b * nsyn^c to every measured target.
+
+    Dimensions that were not varied in the sweep are left out of the fit.
+
+    Returns:
+        pd.DataFrame with one row per target, the log-constant, the exponent of every
+        dimension and the R^2 of the fit in log space
+    """
+    dims = [dim for dim in DIMENSIONS if sweep[dim].nunique() > 1]
+    A = np.column_stack([np.ones(len(sweep))] + [np.log(sweep[dim]) for dim in dims])
+
+    rows = []
+    for target in targets:
+        y = np.log(np.maximum(sweep[target].values, 1e-9))
+        coef, _, _, _ = np.linalg.lstsq(A, y, rcond=None)
+        residual = y - A @ coef
+        r2 = 1 - residual.var() / y.var() if y.var() > 0 else 1.0
+        row = {"target": target, "log_constant": coef[0], "R2": r2}
+        row.update(dict.fromkeys(DIMENSIONS, 0.0))
+        row.update(dict(zip(dims, coef[1:])))
+        rows.append(row)
+    return pd.DataFrame(rows).set_index("target")
+
+
+def predict_cost(cost_model, K, max_n, nsyn):
+    """Predicted cost of each target for one configuration"""
+    config = {"K": K, "max_n": max_n, "nsyn": nsyn}
+    log_cost = cost_model["log_constant"].copy()
+    for dim in DIMENSIONS:
+        log_cost += cost_model[dim] * np.log(config[dim])
+    return np.exp(log_cost)
+
+
+def sweep_report(cost_model, planned, n_configs=1):
+    """Predicted cost of a planned sweep.
+
+    Args:
+        cost_model (pd.DataFrame): Returned by fit_cost_model.
+        planned (list): Configurations, dicts with K, max_n and nsyn, e.g. the loops of
+            do_experiments_batch.py.
+        n_configs (int, optional): Number of times every configuration runs, e.g. the
+            number of datasets times generators. Defaults to 1.
+
+    Returns:
+        pd.DataFrame with the predicted seconds per stage and peak memory of every
+        configuration, and a "total" row
+    """
+    rows = []
+    for config in planned:
+        cost = predict_cost(cost_model, config["K"], config["max_n"], config["nsyn"])
+        row = {dim: config[dim] for dim in DIMENSIONS}
+        row.update({stage: cost[stage] * n_configs for stage in STAGES})
+        row["seconds"] = sum(row[stage] for stage in STAGES)
+        row["peak_mb"] = cost["peak_mb"]
+        rows.append(row)
+
+    report = pd.DataFrame(rows)
+    total = report[STAGES + ["seconds"]].sum()
+    total["peak_mb"] = report["peak_mb"].max()
+    report.loc["total"] = total
+    report["hours"] = report["seconds"] / 3600
+    return report
+
+
+if __name__ == "__main__":
+    # stdlib
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Fit cost models of a DGE sweep")
+    parser.add_argument("--dataset", default="moons")
+    parser.add_argument("--generator", default="stub")
+    parser.add_argument("--model-type", default="mlp")
+    parser.add_argument("--K", type=int, default=20, help="K of the planned sweep")
+    args = parser.parse_args()
+
+    sweep = scaling_sweep(
+        args.dataset, generator=args.generator, model_type=args.model_type
+    )
+    cost_model = fit_cost_model(sweep)
+    print(cost_model.to_string())
+
+    # the grid of do_experiments_batch.py
+    planned = [
+        {"K": args.K, "max_n": max_n, "nsyn": nsyn}
+        for nsyn in [2000, 5000]
+        for max_n in [2000, 5000, 10000]
+        if max_n <= nsyn
+    ]
+    print(sweep_report(cost_model, planned).to_string())
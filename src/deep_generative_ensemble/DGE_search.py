@@ -0,0 +1,338 @@
+# stdlib
+import os
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from functools import partial
+from hashlib import sha256
+
+from deep_generative_ensemble import DGE_serialization
+from deep_generative_ensemble.DGE_dataset import as_dataset
+from deep_generative_ensemble.DGE_reporting import LOWER_IS_BETTER
+from deep_generative_ensemble.DGE_utils import (
+    aggregate_predictive,
+    hash_str2int,
+    tt_predict_performance,
+)
+
+# third party
+import numpy as np
+import pandas as pd
+
+
+def sample_params(param_space, rng):
+    """Draw a random configuration from param_space.
+
+    param_space maps a hyperparameter of the estimator to either a list of choices,
+    a range (low, high), or a log-scaled range (low, high, "log"). Ranges with integer
+    bounds are sampled as integers. E.g. for the MLPs:
+
+        {
+            "hidden_layer_sizes": [(100,), (100, 100), (100, 100, 100)],
+            "alpha": (1e-5, 1e-1, "log"),
+            "batch_size": (32, 512),
+        }
+    """
+    params = {}
+    for name, space in param_space.items():
+        if isinstance(space, list):
+            params[name] = space[rng.integers(len(space))]
+            continue
+
+        low, high = space[0], space[1]
+        log = len(space) > 2 and space[2] == "log"
+        if log:
+            value = np.exp(rng.uniform(np.log(low), np.log(high)))
+        else:
+            value = rng.uniform(low, high)
+
+        if isinstance(low, int) and isinstance(high, int):
+            params[name] = int(np.clip(np.round(value), low, high))
+        else:
+            params[name] = float(value)
+    return params
+
+
+def suggest_params(param_space, trial):
+    """Same as sample_params, but lets an optuna trial choose the configuration"""
+    params = {}
+    for name, space in param_space.items():
+        if isinstance(space, list):
+            # optuna only stores primitive choices, so suggest the index instead
+            index = trial.suggest_categorical(name, list(range(len(space))))
+            params[name] = space[index]
+            continue
+
+        low, high = space[0], space[1]
+        log = len(space) > 2 and space[2] == "log"
+        if isinstance(low, int) and isinstance(high, int):
+            params[name] = trial.suggest_int(name, low, high, log=log)
+        else:
+            params[name] = trial.suggest_float(name, low, high, log=log)
+    return params
+
+
+class MedianStopping:
+    """Median stopping rule for trials that are evaluated member by member.
+
+    After min_members members, a trial is stopped if its running mean score is worse
+    than the median running mean of all other trials that reached the same member.
+    """
+
+    def __init__(self, metric, lower_is_better=False, min_members=3):
+        self.metric = metric
+        self.lower_is_better = lower_is_better
+        self.min_members = min_members
+        self.scores = {}
+        self.lock = threading.Lock()
+
+    def record(self, trial_id, scores):
+        with self.lock:
+            self.scores[trial_id] = list(scores)
+
+    def __call__(self, trial_id, i, res):
+        with self.lock:
+            scores = self.scores.setdefault(trial_id, [])
+            scores.append(float(res[self.metric].iloc[0]))
+            n = len(scores)
+            if n < self.min_members:
+                return False
+
+            others = [
+                np.mean(other[:n])
+                for key, other in self.scores.items()
+                if key != trial_id and len(other) >= n
+            ]
+
+        if len(others) == 0:
+            return False
+
+        running = np.mean(scores)
+        median = np.median(others)
+        if self.lower_is_better:
+            return running > median
+        return running < median
+
+
+def trial_key(X_gt, X_syns, model_type, params, K=None, stopper=None):
+    """Hash of everything the result of a trial depends on: the configuration, the data
+    (dataset, sizes and first rows of the synthetic datasets), K, the approach and the
+    early stopping rule"""
+    data = sha256()
+    for X_syn in X_syns:
+        data.update(np.ascontiguousarray(X_syn.X[:100]).tobytes())
+    stopping = None
+    if stopper is not None:
+        stopping = (stopper.metric, stopper.lower_is_better, stopper.min_members)
+    config = (
+        model_type,
+        sorted(params.items()),
+        getattr(X_gt, "dataset", None),
+        [len(X_syn) for X_syn in X_syns],
+        data.hexdigest(),
+        K,
+        "DGE",
+        stopping,
+    )
+    return hash_str2int(repr(config))
+
+
+def run_trial(
+    X_gt,
+    X_syns,
+    model_type,
+    params,
+    metric,
+    trial_id=0,
+    stopper=None,
+    workspace_folder="workspace",
+    load=True,
+    save=True,
+    K=None,
+    verbose=False,
+):
+    """Score one hyperparameter configuration with DGE synthetic validation.
+
+    Each member is trained on X_syns[i].train() and evaluated on the other synthetic
+    datasets (approach "DGE" in aggregate_predictive). Models and per-member scores
+    are cached in a folder specific to the configuration and data (see trial_key), so
+    interrupted or repeated searches reuse finished trials.
+    """
+    X_gt = as_dataset(X_gt)
+    X_syns = [as_dataset(X_syn) for X_syn in X_syns]
+    key = trial_key(X_gt, X_syns, model_type, params, K, stopper)
+    trial_folder = os.path.join(workspace_folder, "search", f"{model_type}_{key}")
+    filename = os.path.join(trial_folder, "trial.pkl")
+
+    if load and os.path.exists(filename):
+        trial = DGE_serialization.load(filename)
+        # a trial stopped early is only a result under early stopping
+        if trial["status"] == "complete" or stopper is not None:
+            if stopper is not None:
+                stopper.record(trial_id, trial["results"][metric])
+            return trial
+
+    if verbose:
+        print(f"Trial {trial_id}: {params}")
+
+    callback = partial(stopper, trial_id) if stopper is not None else None
+    mean, std, _, results = aggregate_predictive(
+        X_gt,
+        X_syns,
+        task=partial(tt_predict_performance, model_params=params),
+        task_type=model_type,
+        workspace_folder=trial_folder,
+        load=load,
+        save=save,
+        approach="DGE",
+        K=K,
+        callback=callback,
+        verbose=verbose,
+    )
+
+    n_members = len(results)
+    n_expected = len(X_syns) if K is None else min(K, len(X_syns))
+    trial = {
+        "params": params,
+        "score": mean[metric].iloc[0],
+        "std": std[metric].iloc[0],
+        "n_members": n_members,
+        "status": "complete" if n_members == n_expected else "stopped",
+        "results": results,
+    }
+
+    if save:
+        os.makedirs(trial_folder, exist_ok=True)
+        DGE_serialization.dump(trial, filename)
+
+    return trial
+
+
+def hyperparameter_search(
+    X_gt,
+    X_syns,
+    model_type,
+    param_space,
+    n_trials=20,
+    method="random",
+    metric=None,
+    n_jobs=4,
+    early_stopping=True,
+    min_members=3,
+    workspace_folder="workspace",
+    load=True,
+    save=True,
+    K=None,
+    seed=0,
+    verbose=False,
+):
+    """Tune the downstream model on synthetic data only, using DGE validation.
+
+    Args:
+        X_gt (GenericDataLoader): Real data, only used for its target type.
+        X_syns (List(GenericDataLoader)): Synthetic datasets, one per DGE member.
+        model_type (str): Base model type of init_model, e.g. "mlp" or "xgboost".
+        param_space (dict): Search space, see sample_params.
+        n_trials (int, optional): Number of configurations to evaluate. Defaults to 20.
+        method (str, optional): "random" or "bayesian" (TPE, requires optuna).
+        metric (str, optional): Objective, defaults to AUC (classification) or RMSE.
+        n_jobs (int, optional): Number of trials evaluated in parallel. Defaults to 4.
+        early_stopping (bool, optional): Stop trials that fall below the median of
+            the other trials after min_members members. Defaults to True.
+
+    Returns:
+        best_params (dict), trials (pd.DataFrame) sorted from best to worst
+    """
+    # unpacked once for all trials, see DGE_dataset
+    X_gt = as_dataset(X_gt)
+    X_syns = [as_dataset(X_syn) for X_syn in X_syns]
+    if metric is None:
+        metric = "AUC" if X_gt.targettype == "classification" else "RMSE"
+    lower_is_better = metric in LOWER_IS_BETTER
+
+    if method == "random":
+        rng = np.random.default_rng(seed)
+    elif method == "bayesian":
+        try:
+            # third party
+            import optuna
+        except ImportError:
+            raise ImportError("Bayesian search requires optuna: pip install optuna")
+
+        study = optuna.create_study(
+            direction="minimize" if lower_is_better else "maximize",
+            sampler=optuna.samplers.TPESampler(seed=seed),
+        )
+    else:
+        raise ValueError(f"Unknown search method {method}")
+
+    stopper = None
+    if early_stopping:
+        stopper = MedianStopping(metric, lower_is_better, min_members)
+
+    trials = []
+
+    def finish(future, trial_id, params, handle):
+        trial = future.result()
+        if verbose:
+            print(f"Trial {trial_id} {trial['status']}: {metric}={trial['score']:.4f}")
+        trials.append(
+            {
+                "trial": trial_id,
+                "params": params,
+                **params,
+                metric: trial["score"],
+                f"{metric} std": trial["std"],
+                "n_members": trial["n_members"],
+                "status": trial["status"],
+            }
+        )
+        if handle is not None:
+            if trial["status"] == "complete":
+                study.tell(handle, trial["score"])
+            else:
+                study.tell(handle, state=optuna.trial.TrialState.PRUNED)
+
+    running = {}
+    with ThreadPoolExecutor(max_workers=n_jobs) as executor:
+        for trial_id in range(n_trials):
+            if len(running) >= n_jobs:
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    finish(future, *running.pop(future))
+
+            if method == "random":
+                handle = None
+                params = sample_params(param_space, rng)
+            else:
+                handle = study.ask()
+                params = suggest_params(param_space, handle)
+
+            future = executor.submit(
+                run_trial,
+                X_gt,
+                X_syns,
+                model_type,
+                params,
+                metric,
+                trial_id=trial_id,
+                stopper=stopper,
+                workspace_folder=workspace_folder,
+                load=load,
+                save=save,
+                K=K,
+                verbose=verbose,
+            )
+            running[future] = (trial_id, params, handle)
+
+        for future in list(running):
+            finish(future, *running.pop(future))
+
+    trials = pd.DataFrame(trials)
+    trials["complete"] = trials["status"] == "complete"
+    trials = trials.sort_values(
+        ["complete", metric], ascending=[False, lower_is_better]
+    ).drop(columns="complete")
+    trials = trials.set_index("trial")
+
+    best_params = trials["params"].iloc[0]
+    return best_params, trials
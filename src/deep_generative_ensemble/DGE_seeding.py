@@ -0,0 +1,47 @@
+# stdlib
+import os
+from hashlib import sha256
+
+# third party
+import numpy as np
+
+# Every fit gets its own random stream, derived from the root seed and the keys that
+# identify it, e.g. (experiment, run, approach, member). Streams do not depend on the
+# order in which tasks run, so serial and parallel runs give identical results.
+ROOT_SEED = int(os.environ.get("DGE_SEED", 0))
+
+
+def _key_to_int(key):
+    return int(sha256(str(key).encode("utf-8")).hexdigest(), 16) % (2**32)
+
+
+def path_key(path):
+    """The key of an artifact cached at path (workspace, dataset, run, approach, ...),
+    with / separators so that seeds are the same on every platform"""
+    return os.path.normpath(path).replace(os.sep, "/")
+
+
+def seed_sequence(*keys, root=None):
+    """The numpy SeedSequence of the stream identified by keys"""
+    root = ROOT_SEED if root is None else root
+    return np.random.SeedSequence(root, spawn_key=tuple(_key_to_int(k) for k in keys))
+
+
+def derive_seed(*keys, root=None):
+    """An integer seed for the stream identified by keys, e.g. for random_state"""
+    return int(seed_sequence(*keys, root=root).generate_state(1)[0])
+
+
+def rng(*keys, root=None):
+    """A numpy Generator for the stream identified by keys"""
+    return np.random.default_rng(seed_sequence(*keys, root=root))
+
+
+def torch_generator(*keys, root=None, device="cpu"):
+    """A torch Generator for the stream identified by keys"""
+    # third party
+    import torch
+
+    generator = torch.Generator(device=device)
+    generator.manual_seed(derive_seed(*keys, root=root))
+    return generator
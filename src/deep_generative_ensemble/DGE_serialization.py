@@ -0,0 +1,176 @@
+# stdlib
+import os
+import pickle
+import time
+import zlib
+
+from deep_generative_ensemble.DGE_profiling import profile_stage
+
+# third party
+import pandas as pd
+
+# Compressed payloads start with HEADER, the length of the codec name and the name.
+# Anything else is read as a plain pickle, which keeps existing files readable.
+HEADER = b"DGES"
+CODECS = ["pickle", "gzip", "zstd", "lz4", "joblib"]
+DEFAULT_LEVELS = {"gzip": 6, "zstd": 3, "lz4": 0, "joblib": 0}
+
+# The codec can be set per process with the DGE_CODEC environment variable, e.g. for
+# pool workers, or with set_default_codec.
+DEFAULT_CODEC = os.environ.get("DGE_CODEC", "pickle")
+DEFAULT_LEVEL = None
+MMAP_MODE = os.environ.get("DGE_MMAP_MODE") or None
+N_JOBS = int(os.environ.get("DGE_IO_THREADS", 4))
+
+STATS = []
+# functions called with the path of every artifact file that is read or written,
+# e.g. to track access times for DGE_cache
+ACCESS_HOOKS = []
+
+
+def set_default_codec(codec, level=None):
+    """Set the codec used by dump, dumps and the model bundles"""
+    global DEFAULT_CODEC, DEFAULT_LEVEL
+    if codec not in CODECS:
+        raise ValueError(f"Unknown codec {codec}, choose from {CODECS}")
+    DEFAULT_CODEC = codec
+    DEFAULT_LEVEL = level
+
+
+def serialization_stats():
+    """Bytes and seconds per serialized artifact, to compare codecs"""
+    stats = pd.DataFrame(STATS, columns=["path", "op", "codec", "bytes", "seconds"])
+    stats["MB/s"] = stats["bytes"] / 1e6 / stats["seconds"]
+    return stats
+
+
+def reset_stats():
+    STATS.clear()
+
+
+def touch(path):
+    for hook in ACCESS_HOOKS:
+        hook(path)
+
+
+def record(path, op, codec, n_bytes, start):
+    """Add an artifact that was read or written since start to the stats"""
+    STATS.append((path, op, codec, n_bytes, time.perf_counter() - start))
+
+
+def _compress(data, codec, level):
+    if codec == "gzip":
+        return zlib.compress(data, level)
+    elif codec == "zstd":
+        # third party
+        import zstandard
+
+        return zstandard.ZstdCompressor(level=level).compress(data)
+    elif codec == "lz4":
+        # third party
+        import lz4.frame
+
+        return lz4.frame.compress(data, compression_level=level)
+    raise ValueError(f"Unknown codec {codec}")
+
+
+def _decompress(data, codec):
+    if codec == "gzip":
+        return zlib.decompress(data)
+    elif codec == "zstd":
+        # third party
+        import zstandard
+
+        return zstandard.ZstdDecompressor().decompress(data)
+    elif codec == "lz4":
+        # third party
+        import lz4.frame
+
+        return lz4.frame.decompress(data)
+    raise ValueError(f"Unknown codec {codec}")
+
+
+def bytes_codec(codec=None):
+    """The codec dumps uses for codec. joblib is file based, so gives a plain pickle"""
+    codec = codec or DEFAULT_CODEC
+    return "pickle" if codec == "joblib" else codec
+
+
+def dumps(obj, codec=None, level=None):
+    """Serialize obj to bytes with bytes_codec(codec)"""
+    codec = bytes_codec(codec)
+    data = pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL)
+    if codec == "pickle":
+        return data
+
+    if level is None:
+        level = DEFAULT_LEVEL if DEFAULT_LEVEL is not None else DEFAULT_LEVELS[codec]
+    name = codec.encode("ascii")
+    return HEADER + bytes([len(name)]) + name + _compress(data, codec, level)
+
+
+def loads(data):
+    if data.startswith(HEADER):
+        n = data[len(HEADER)]
+        start = len(HEADER) + 1
+        codec = data[start : start + n].decode("ascii")
+        data = _decompress(data[start + n :], codec)
+    return pickle.loads(data)
+
+
+def dump(obj, path, codec=None, level=None):
+    """Write obj to path, returns the number of bytes written"""
+    codec = codec or DEFAULT_CODEC
+    start = time.perf_counter()
+    with profile_stage("serialization.dump", codec=codec):
+        if codec == "joblib":
+            # third party
+            import joblib
+
+            if level is None:
+                level = DEFAULT_LEVEL if DEFAULT_LEVEL is not None else 0
+            # uncompressed joblib files can be memory-mapped by load
+            joblib.dump(obj, path, compress=level)
+        else:
+            data = dumps(obj, codec, level)
+            with open(path, "wb") as f:
+                f.write(data)
+
+    n_bytes = os.path.getsize(path)
+    record(path, "dump", codec, n_bytes, start)
+    touch(path)
+    return n_bytes
+
+
+def load(path, mmap_mode=None):
+    """Read an object written by dump, or any plain pickle.
+
+    With mmap_mode (e.g. "r"), large numpy arrays in uncompressed joblib files are
+    memory-mapped instead of read. Defaults to the DGE_MMAP_MODE environment variable.
+    """
+    mmap_mode = mmap_mode or MMAP_MODE
+    start = time.perf_counter()
+    with profile_stage("serialization.load"):
+        with open(path, "rb") as f:
+            header = f.read(len(HEADER))
+
+        if header == HEADER:
+            with open(path, "rb") as f:
+                obj = loads(f.read())
+            codec = "compressed"
+        else:
+            try:
+                # third party
+                import joblib
+
+                # reads joblib files as well as plain pickles
+                obj = joblib.load(path, mmap_mode=mmap_mode)
+                codec = "joblib"
+            except ImportError:
+                with open(path, "rb") as f:
+                    obj = pickle.load(f)
+                codec = "pickle"
+
+    record(path, "load", codec, os.path.getsize(path), start)
+    touch(path)
+    return obj
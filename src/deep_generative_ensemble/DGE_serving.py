@@ -0,0 +1,291 @@
+# stdlib
+import json
+import os
+import queue
+import sys
+import threading
+import traceback
+from concurrent.futures import Future, ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from deep_generative_ensemble import DGE_serialization
+from deep_generative_ensemble.DGE_artifacts import FUSED_KEY, ModelStore, fused_store
+
+# third party
+import numpy as np
+
+
+class DGEEnsemble:
+    """The K fitted downstream models of a DGE, loaded once for serving.
+
+    predict_mean_std(X) returns the mean prediction across members and the std across
+    members, i.e. the DGE prediction and its model uncertainty. Inputs are split into
+    micro-batches of batch_size rows and members are evaluated in a thread pool.
+    """
+
+    def __init__(
+        self, models, targettype="classification", batch_size=1024, n_jobs=None
+    ):
+        self.models = list(models)
+        self.targettype = targettype
+        self.batch_size = batch_size
+        self.n_jobs = n_jobs or min(len(self.models), os.cpu_count() or 1)
+        self.compiled = None
+        self._executor = None
+
+    @classmethod
+    def from_workspace(
+        cls,
+        workspace_folder,
+        task_type,
+        filename="",
+        K=20,
+        task_name="supervised_task",
+        targettype="classification",
+        **kwargs,
+    ):
+        """Load the first K members that aggregate saved to workspace_folder"""
+        fileroot = f"{workspace_folder}/{task_name}_{task_type}"
+
+        # written by load_or_fit_members for fused model types
+        with fused_store(f"{fileroot}_{filename}") as store:
+            models = store.get(FUSED_KEY)
+        if models is not None:
+            models = models[:K]
+        else:
+            with ModelStore(
+                f"{fileroot}_{filename}.dge",
+                legacy_filename=lambda i: f"{fileroot}_{filename}_{i}.pkl",
+            ) as store:
+                models = [store.get(i) for i in range(K)]
+            if any(model is None for model in models):
+                raise FileNotFoundError(f"Less than {K} models in {workspace_folder}")
+
+        return cls(models, targettype, **kwargs)
+
+    @classmethod
+    def load(cls, path, **kwargs):
+        state = DGE_serialization.load(path)
+        return cls(state["models"], state["targettype"], **kwargs)
+
+    def save(self, path):
+        DGE_serialization.dump(
+            {"models": self.models, "targettype": self.targettype}, path
+        )
+
+    def compile(self, dtype=np.float64):
+        """Predict with all members at once through a CompiledEnsemble.
+
+        Only for members of model type "lr" or the MLPs, see compile_ensemble.
+        """
+        from deep_generative_ensemble.DGE_compile import compile_ensemble
+
+        self.compiled = compile_ensemble(self.models, self.targettype, dtype)
+        return self
+
+    @property
+    def executor(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.n_jobs)
+        return self._executor
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_executor"] = None
+        return state
+
+    @property
+    def n_features(self):
+        """Number of input features, None if the members do not record it"""
+        return getattr(self.models[0], "n_features_in_", None)
+
+    def _predict_member(self, model, X):
+        if self.targettype == "regression":
+            return model.predict(X)
+        return model.predict_proba(X)[:, 1]
+
+    def predict_members(self, X):
+        """Predictions of every member, shape K x n"""
+        X = np.asarray(X)
+        if X.ndim == 1:
+            X = X[None]
+
+        preds = np.empty((len(self.models), X.shape[0]))
+        batches = [
+            slice(start, start + self.batch_size)
+            for start in range(0, X.shape[0], self.batch_size)
+        ]
+
+        if self.compiled is not None:
+            for batch in batches:
+                preds[:, batch] = self.compiled.predict_members(X[batch])
+            return preds
+
+        def predict(job):
+            k, batch = job
+            preds[k, batch] = self._predict_member(self.models[k], X[batch])
+
+        jobs = [(k, batch) for batch in batches for k in range(len(self.models))]
+        list(self.executor.map(predict, jobs))
+        return preds
+
+    def predict_mean_std(self, X):
+        preds = self.predict_members(X)
+        return preds.mean(axis=0), preds.std(axis=0)
+
+    def serve_http(self, host="127.0.0.1", port=8000, max_delay=0.005):
+        """Serve POST /predict with body {"X": [[...], ...]}, returns mean and std.
+
+        Concurrent requests are coalesced into one batch by a MicroBatcher.
+        """
+        batcher = MicroBatcher(self, max_delay=max_delay)
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                if self.path != "/predict":
+                    self.send_error(404)
+                    return
+                try:
+                    length = int(self.headers.get("Content-Length", 0))
+                    X = json.loads(self.rfile.read(length))["X"]
+                    mean, std = batcher.submit(X).result()
+                except (ValueError, KeyError, TypeError) as e:
+                    # TypeError for bodies that are not objects, e.g. lists
+                    self.send_error(400, str(e))
+                    return
+                except Exception as e:
+                    # a failing model must not leave the client without a response
+                    traceback.print_exc()
+                    self.send_error(500, str(e))
+                    return
+
+                body = json.dumps({"mean": mean.tolist(), "std": std.tolist()})
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body.encode("utf-8"))
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        print(f"Serving DGE ensemble of {len(self.models)} models on {host}:{port}")
+        try:
+            server.serve_forever()
+        finally:
+            server.server_close()
+            batcher.close()
+
+    def serve_stdio(self, stdin=None, stdout=None):
+        """Answer one JSON request {"X": [[...], ...]} per line of stdin"""
+        stdin = stdin or sys.stdin
+        stdout = stdout or sys.stdout
+        for line in stdin:
+            if not line.strip():
+                continue
+            try:
+                mean, std = self.predict_mean_std(json.loads(line)["X"])
+                response = {"mean": mean.tolist(), "std": std.tolist()}
+            except (ValueError, KeyError, TypeError) as e:
+                response = {"error": str(e)}
+            stdout.write(json.dumps(response) + "\n")
+            stdout.flush()
+
+
+class MicroBatcher:
+    """Coalesces concurrent prediction requests into batches of an ensemble.
+
+    Requests are collected until no new request arrives within max_delay seconds, or
+    batch_size rows are waiting, and then predicted in one predict_mean_std call.
+    """
+
+    def __init__(self, ensemble, max_delay=0.005, batch_size=None):
+        self.ensemble = ensemble
+        self.max_delay = max_delay
+        self.batch_size = batch_size or ensemble.batch_size
+        self.requests = queue.Queue()
+        self.thread = threading.Thread(target=self._loop, daemon=True)
+        self.thread.start()
+
+    def submit(self, X):
+        """Returns a future with the (mean, std) of X"""
+        X = np.atleast_2d(np.asarray(X, dtype=float))
+        n_features = self.ensemble.n_features
+        if X.ndim != 2 or (n_features is not None and X.shape[1] != n_features):
+            raise ValueError(
+                f"Expected rows of {n_features} features, got shape {X.shape}"
+            )
+        future = Future()
+        self.requests.put((X, future))
+        return future
+
+    def close(self):
+        self.requests.put(None)
+        self.thread.join()
+
+    def _loop(self):
+        while True:
+            request = self.requests.get()
+            if request is None:
+                return
+
+            batch = [request]
+            n_rows = request[0].shape[0]
+            while n_rows < self.batch_size:
+                try:
+                    request = self.requests.get(timeout=self.max_delay)
+                except queue.Empty:
+                    break
+                if request is None:
+                    self.requests.put(None)
+                    break
+                batch.append(request)
+                n_rows += request[0].shape[0]
+
+            try:
+                mean, std = self.ensemble.predict_mean_std(
+                    np.concatenate([X for X, _ in batch], axis=0)
+                )
+            except Exception:
+                # predict one by one, so that a bad request only fails itself
+                for X, future in batch:
+                    try:
+                        future.set_result(self.ensemble.predict_mean_std(X))
+                    except Exception as e:
+                        future.set_exception(e)
+                continue
+
+            start = 0
+            for X, future in batch:
+                end = start + X.shape[0]
+                future.set_result((mean[start:end], std[start:end]))
+                start = end
+
+
+if __name__ == "__main__":
+    # stdlib
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Serve a saved DGE ensemble")
+    parser.add_argument("path", help="file written by DGEEnsemble.save")
+    parser.add_argument("--port", type=int, default=None, help="serve over HTTP")
+    parser.add_argument("--host", default="127.0.0.1")
+    args = parser.parse_args()
+
+    with DGEEnsemble.load(args.path) as ensemble:
+        if args.port is None:
+            ensemble.serve_stdio()
+        else:
+            ensemble.serve_http(args.host, args.port)
@@ -0,0 +1,157 @@
+# stdlib
+import json
+import os
+import time
+
+from deep_generative_ensemble import DGE_serialization
+
+# third party
+import pandas as pd
+
+# A stream is a folder of part files, written one after another, and a manifest of
+# the parts and their row counts. The manifest is replaced atomically after every
+# part, so readers only ever see complete parts and can start on the first rows while
+# the rest is still being generated. Parts are parquet files if pyarrow is installed,
+# pickles otherwise.
+MANIFEST = "manifest.json"
+
+
+def parquet_available():
+    try:
+        # third party
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def batch_sizes(count, batch_size):
+    """Sizes of the batches of count rows, all batch_size but the last"""
+    return [min(batch_size, count - start) for start in range(0, count, batch_size)]
+
+
+def manifest_path(folder):
+    return os.path.join(folder, MANIFEST)
+
+
+def read_manifest(folder):
+    with open(manifest_path(folder)) as f:
+        return json.load(f)
+
+
+def _write_manifest(folder, manifest):
+    tmp = manifest_path(folder) + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(manifest, f)
+    os.replace(tmp, manifest_path(folder))
+
+
+def write_stream(batches, folder, fmt=None):
+    """Write batches (DataFrames or DataLoaders) to folder as they come.
+
+    Args:
+        batches (Iterable): e.g. a generator that generates one batch at a time, so
+            that only one batch is in memory.
+        folder (str): Folder of the stream, created if needed.
+        fmt (str, optional): "parquet" or "pickle". Defaults to parquet if available.
+
+    Returns:
+        dict, the manifest
+    """
+    fmt = fmt or ("parquet" if parquet_available() else "pickle")
+    os.makedirs(folder, exist_ok=True)
+    manifest = {
+        "format": fmt,
+        "columns": None,
+        "parts": [],
+        "rows": 0,
+        "complete": False,
+    }
+    _write_manifest(folder, manifest)
+
+    for part, batch in enumerate(batches):
+        if not isinstance(batch, pd.DataFrame):
+            batch = batch.dataframe()
+        if manifest["columns"] is None:
+            # numpy scalars to python, for json
+            manifest["columns"] = [
+                c.item() if hasattr(c, "item") else c for c in batch.columns
+            ]
+
+        name = f"part-{part:05d}." + ("parquet" if fmt == "parquet" else "pkl")
+        path = os.path.join(folder, name)
+        if fmt == "parquet":
+            # parquet only takes string column names, see read_part
+            batch.set_axis(batch.columns.astype(str), axis=1).to_parquet(path)
+            DGE_serialization.touch(path)
+        else:
+            DGE_serialization.dump(batch, path)
+
+        manifest["parts"].append({"file": name, "rows": len(batch)})
+        manifest["rows"] += len(batch)
+        _write_manifest(folder, manifest)
+
+    manifest["complete"] = True
+    _write_manifest(folder, manifest)
+    return manifest
+
+
+def read_part(folder, manifest, part):
+    path = os.path.join(folder, manifest["parts"][part]["file"])
+    if manifest["format"] == "parquet":
+        DGE_serialization.touch(path)
+        df = pd.read_parquet(path)
+        df.columns = manifest["columns"]
+        return df
+    return DGE_serialization.load(path)
+
+
+def iter_stream(folder, wait=False, timeout=None, poll=0.5):
+    """The parts of the stream in folder as DataFrames, in order.
+
+    With wait, parts that are still being generated are waited for (at most timeout
+    seconds), so that consumers can start before generation finishes.
+    """
+    start = time.perf_counter()
+    part = 0
+    while True:
+        manifest = read_manifest(folder)
+        while part < len(manifest["parts"]):
+            yield read_part(folder, manifest, part)
+            part += 1
+        if manifest["complete"] or not wait:
+            return
+        if timeout is not None and time.perf_counter() - start > timeout:
+            raise TimeoutError(f"Stream {folder} incomplete after {timeout}s")
+        time.sleep(poll)
+
+
+def read_stream(folder, n_rows=None, wait=False, timeout=None):
+    """The first n_rows rows of the stream in folder (all if None), reading only the
+    parts that hold them"""
+    parts = []
+    rows = 0
+    for df in iter_stream(folder, wait=wait, timeout=timeout):
+        parts.append(df)
+        rows += len(df)
+        if n_rows is not None and rows >= n_rows:
+            break
+
+    if not parts:
+        return pd.DataFrame(columns=read_manifest(folder)["columns"])
+    df = pd.concat(parts, ignore_index=True)
+    return df if n_rows is None else df.iloc[:n_rows]
+
+
+def stream_rows(folder):
+    """Rows in the complete stream in folder, 0 if there is none or any of its parts is
+    missing, e.g. evicted, so that the stream is generated again"""
+    if not os.path.exists(manifest_path(folder)):
+        return 0
+    manifest = read_manifest(folder)
+    if not manifest["complete"]:
+        return 0
+    for part in manifest["parts"]:
+        if not os.path.exists(os.path.join(folder, part["file"])):
+            return 0
+    return manifest["rows"]
@@ -1,15 +1,17 @@
 # stdlib
+import copy
 import os
-import pickle
 from hashlib import sha256
 
+from deep_generative_ensemble import DGE_reporting
+from deep_generative_ensemble.DGE_artifacts import FUSED_KEY, ModelStore, fused_store
+from deep_generative_ensemble.DGE_dataset import ArrayDataset, as_dataset
+from deep_generative_ensemble.DGE_profiling import profile_stage, profile_tags, profiled
+from deep_generative_ensemble.DGE_seeding import derive_seed, path_key
+
 # third party
-import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
-import sklearn
-import xgboost
-from mpl_toolkits.axes_grid1 import make_axes_locatable
 from sklearn.metrics import (
     accuracy_score,
     brier_score_loss,
@@ -21,13 +23,13 @@ from sklearn.metrics import (
     recall_score,
     roc_auc_score,
 )
-from sklearn.neural_network import MLPClassifier, MLPRegressor
-from sklearn.pipeline import Pipeline
-from sklearn.preprocessing import StandardScaler
 
-# synthcity absolute
-from synthcity.plugins.core.dataloader import GenericDataLoader
-from synthcity.utils import reproducibility
+# Plotting, synthcity, xgboost, torch and the model classes of sklearn are imported in
+# the functions that use them, so that importing this module, e.g. for compute_metrics
+# in pool workers, stays fast. See import_time in DGE_benchmarks.
+
+# model types of which all DGE members are trained at once, see fit_members
+FUSED_MODEL_TYPES = ["ensemble_mlp"]
 
 
 def hash_str2int(s):
@@ -51,10 +53,20 @@ def accuracy_confidence_curve(y_true, y_prob, n_bins=20):
     return thresholds, accs
 
 
+@profiled("cat_dl")
 def cat_dl(X_syns, n_limit=None):
     """
-    Concatenate a list of GenericDataLoader objects into one GenericDataLoader object
+    Concatenate a list of GenericDataLoader objects into one GenericDataLoader object,
+    or a list of ArrayDatasets into one ArrayDataset
     """
+    if all(isinstance(X_syn, ArrayDataset) for X_syn in X_syns):
+        X_syn_cat = ArrayDataset.concat(X_syns, n_limit)
+        X_syn_cat.targettype = X_syns[0].targettype
+        return X_syn_cat
+
+    # synthcity absolute
+    from synthcity.plugins.core.dataloader import GenericDataLoader
+
     if n_limit is not None:
         X_syn_cat = pd.concat([X_syns[i][:n_limit] for i in range(len(X_syns))], axis=0)
     else:
@@ -78,15 +90,25 @@ def parallel_for(func, args_list, max_workers=4):
     return results
 
 
-def init_model(model_type, targettype):
+def init_model(model_type, targettype, random_state=None, **params):
     """
-    Initialize a model of the given type.
+    Initialize a model of the given type. Keyword arguments override the default
+    hyperparameters of the underlying estimator, e.g. hidden_layer_sizes or alpha.
+    random_state seeds estimators that are random, see DGE_seeding.
     """
+    # third party
+    from sklearn.neural_network import MLPClassifier, MLPRegressor
+    from sklearn.pipeline import Pipeline
+    from sklearn.preprocessing import StandardScaler
+
     if model_type == "lr":
+        # third party
+        from sklearn.linear_model import LinearRegression, LogisticRegression
+
         if targettype == "classification":
-            model = sklearn.linear_model.LogisticRegression()
+            model = LogisticRegression()
         else:
-            model = sklearn.linear_model.LinearRegression()
+            model = LinearRegression()
     elif model_type == "smallest_mlp":
         if targettype == "classification":
             model = MLPClassifier(hidden_layer_sizes=(50))
@@ -114,47 +136,131 @@ def init_model(model_type, targettype):
         else:
             model = MLPRegressor(hidden_layer_sizes=(500, 500, 500))
     elif model_type == "rf":
+        # third party
+        from sklearn.ensemble import RandomForestClassifier, RandomForestRegressor
+
         # default 100 trees
         if targettype == "classification":
-            model = sklearn.ensemble.RandomForestClassifier()
+            model = RandomForestClassifier()
         else:
-            model = sklearn.ensemble.RandomForestRegressor()
+            model = RandomForestRegressor()
     elif model_type == "knn":
+        # third party
+        from sklearn.neighbors import KNeighborsClassifier, KNeighborsRegressor
+
         # default 5 neighbors
         if targettype == "classification":
-            model = sklearn.neighbors.KNeighborsClassifier()
+            model = KNeighborsClassifier()
         else:
-            model = sklearn.neighbors.KNeighborsRegressor()
+            model = KNeighborsRegressor()
     elif model_type == "svm":
+        # third party
+        from sklearn.svm import SVC, SVR
+
         # default rbf kernel
         if targettype == "classification":
-            model = sklearn.svm.SVC(probability=True)
+            model = SVC(probability=True)
         else:
-            model = sklearn.svm.SVR()
+            model = SVR()
     elif model_type == "xgboost":
+        # third party
+        import xgboost
+
         if targettype == "classification":
             model = xgboost.XGBClassifier()
         else:
             model = xgboost.XGBRegressor()
+    elif model_type == "ensemble_mlp":
+        from deep_generative_ensemble.DGE_ensemble_mlp import EnsembleMLP
+
+        # members standardise their own inputs, so no scaling pipeline
+        model = EnsembleMLP(
+            targettype, hidden_layer_sizes=(100), random_state=random_state
+        )
+        return model.set_params(**params)
     else:
         raise ValueError("Unknown model type")
 
+    if random_state is not None and "random_state" in model.get_params():
+        model.set_params(random_state=random_state)
+    if params:
+        model.set_params(**params)
+
     # Wrap the model in a pipeline to scale the data
     # Add scaling only of continuous and encoding of categorical
     model = Pipeline([("scaler", StandardScaler()), ("model", model)])
     return model
 
 
-def supervised_task(X_gt, X_syn, model=None, model_type="mlp", verbose=False):
+def fit_members(X_trains, model_type, targettype, random_state=None, **params):
+    """
+    Fit one member per training set for a fused model type (see FUSED_MODEL_TYPES),
+    training all members in a single batched loop. Returns the fitted members.
+    """
+    model = init_model(model_type, targettype, random_state, **params)
+    data = [X_train.unpack(as_numpy=True) for X_train in X_trains]
+    model.fit([X for X, _ in data], [y for _, y in data])
+    return model.members()
+
+
+def warm_start_fit(init, X, y, max_iter=None):
+    """
+    Fit a copy of the fitted pipeline init on (X, y), continuing from its parameters
+    instead of a new random initialisation. max_iter is the number of additional epochs
+    (MLPs, logistic regression) or boosting rounds (xgboost) and defaults to a quarter
+    of the original budget. Warm-started models keep the scaler of init, which their
+    parameters were fitted for, and only the estimator is trained further. Models
+    without warm starts are refitted from scratch, scaler included.
+    """
+    model = copy.deepcopy(init)
+    scaler = model.named_steps["scaler"]
+    estimator = model.named_steps["model"]
+
+    # xgboost models, checked without importing xgboost
+    if hasattr(estimator, "get_booster"):
+        booster = estimator.get_booster()
+        if max_iter is None:
+            max_iter = max(booster.num_boosted_rounds() // 4, 1)
+        estimator.set_params(n_estimators=max_iter)
+        estimator.fit(scaler.transform(X), y, xgb_model=booster)
+    elif hasattr(estimator, "warm_start") and hasattr(estimator, "max_iter"):
+        if max_iter is None:
+            max_iter = max(estimator.max_iter // 4, 1)
+        estimator.set_params(warm_start=True, max_iter=max_iter)
+        estimator.fit(scaler.transform(X), y)
+    else:
+        model.fit(X, y)
+    return model
+
+
+def supervised_task(
+    X_gt,
+    X_syn,
+    model=None,
+    model_type="mlp",
+    verbose=False,
+    model_params=None,
+    init=None,
+    warm_iter=None,
+    random_state=None,
+):
     if type(model) == str or model is None:
-        model = init_model(model_type, X_syn.targettype)
         X, y = X_syn.unpack(as_numpy=True)
-        model.fit(X, y.reshape(-1, 1))
+        with profile_stage("fit", model_type=model_type, n=len(X)):
+            if init is not None:
+                model = warm_start_fit(init, X, y.reshape(-1, 1), warm_iter)
+            else:
+                model = init_model(
+                    model_type, X_syn.targettype, random_state, **(model_params or {})
+                )
+                model.fit(X, y.reshape(-1, 1))
 
-    if X_gt.targettype == "regression":
-        pred = model.predict(X_gt.unpack(as_numpy=True)[0])
-    else:
-        pred = model.predict_proba(X_gt.unpack(as_numpy=True)[0])[:, 1]
+    X = X_gt.unpack(as_numpy=True)[0]
+    with profile_stage("predict", model_type=model_type, n=len(X)):
+        if X_gt.targettype == "regression":
+            pred = model.predict(X)
+        else:
+            pred = model.predict_proba(X)[:, 1]
     return pred, model
 
 
@@ -168,6 +274,7 @@ def roc_auc_score_rob(y_true, y_score, throw_error_if_nan=True):
         return np.nan
 
 
+@profiled("compute_metrics")
 def compute_metrics(y_test, yhat_test, targettype="classification"):
     if targettype == "classification":
         y_test = y_test.astype(bool)
@@ -206,7 +313,16 @@ def compute_metrics(y_test, yhat_test, targettype="classification"):
 
 
 def tt_predict_performance(
-    X_test, X_train, model=None, model_type="mlp", subset=None, verbose=False
+    X_test,
+    X_train,
+    model=None,
+    model_type="mlp",
+    subset=None,
+    verbose=False,
+    model_params=None,
+    init=None,
+    warm_iter=None,
+    random_state=None,
 ):
     """compute train_test performance for different metrics"""
     # import metrics
@@ -217,13 +333,20 @@ def tt_predict_performance(
     x_test, y_test = X_test.unpack(as_numpy=True)
 
     if model is None:
-        model = init_model(model_type, X_test.targettype)
-        model.fit(x_train, y_train)
+        with profile_stage("fit", model_type=model_type, n=len(x_train)):
+            if init is not None:
+                model = warm_start_fit(init, x_train, y_train, warm_iter)
+            else:
+                model = init_model(
+                    model_type, X_test.targettype, random_state, **(model_params or {})
+                )
+                model.fit(x_train, y_train)
 
-    if X_test.targettype == "regression":
-        yhat_test = model.predict(x_test)
-    else:
-        yhat_test = model.predict_proba(x_test)[:, 1]
+    with profile_stage("predict", model_type=model_type, n=len(x_test)):
+        if X_test.targettype == "regression":
+            yhat_test = model.predict(x_test)
+        else:
+            yhat_test = model.predict_proba(x_test)[:, 1]
 
     scores = compute_metrics(y_test, yhat_test, X_test.targettype)
     return scores, model
@@ -245,15 +368,31 @@ def aggregate_predictive(
     verbose=False,
     K=None,
     subset=None,
+    callback=None,
+    warm_start=False,
+    warm_iter=None,
 ):
     """
     aggregate predictions from different synthetic datasets
+
+    callback(i, res) is called after each member i has been evaluated. If it returns
+    True, the remaining members are skipped, e.g. to stop poor hyperparameter trials.
+
+    With warm_start, members after the first start from the first member's fitted
+    parameters and train for warm_iter more iterations (see warm_start_fit).
     """
 
+    # no-ops for ArrayDatasets, which the experiments pass already
+    X_gt = as_dataset(X_gt)
+    X_syns = [as_dataset(X_syn) for X_syn in X_syns]
+
     results = []
     stds = []
     trained_models = []
     fileroot = os.path.join(workspace_folder, f"model_eval_{task_type}")
+    if warm_start:
+        # warm_iter changes the fitted models, so it is part of the cache key
+        fileroot += "_warm" if warm_iter is None else f"_warm{warm_iter}"
 
     if K is None:
         K = len(X_syns)
@@ -266,18 +405,32 @@ def aggregate_predictive(
     else:
         range_limit = 1
 
+    if models is None and task_type in FUSED_MODEL_TYPES:
+        models = load_or_fit_members(
+            [X_syns[i].train() for i in range(range_limit)],
+            task_type,
+            X_syns[0].targettype,
+            fileroot,
+            load=load,
+            save=save,
+        )
+
+    # all members are cached in one bundle, see DGE_artifacts
+    store = ModelStore(
+        f"{fileroot}.dge", legacy_filename=lambda i: f"{fileroot}_{i}.pkl"
+    )
+    if load and models is None:
+        # load the next members while the current one is evaluated
+        store.prefetch(range(range_limit))
+
     for i in range(range_limit):
-        filename = f"{fileroot}_{i}.pkl"
         if models is None:
-            if os.path.exists(filename) and load:
-                model = pickle.load(open(filename, "rb"))
-            else:
-                model = None
-                if verbose:
-                    print(f"Train model {i+1}/{len(X_syns)} and save as {filename}")
+            model = store.get(i) if load else None
+            if model is None and verbose:
+                print(f"Train model {i+1}/{len(X_syns)} and save in {store.path}")
         else:
             model = models[i]
-        reproducibility.enable_reproducible_results()
+        train_new = models is None and model is None
         X_train = X_syns[i].train()
         if approach == "Naive":
             X_test = X_syns[i].test()
@@ -292,13 +445,26 @@ def aggregate_predictive(
         else:
             raise ValueError("Unknown approach")
 
+        # the seed of a member only depends on where it is cached, not on the order
+        # in which members and approaches are trained, see DGE_seeding
+        task_kwargs = {"random_state": derive_seed(path_key(fileroot), i)}
+        if warm_start and i > 0:
+            task_kwargs.update(init=trained_models[0], warm_iter=warm_iter)
+
         if "alternative" not in approach:
             X_test.targettype = X_syns[0].targettype
             X_train.targettype = X_syns[0].targettype
 
-            res, model = task(
-                X_test, X_train, model, task_type, subset=subset, verbose=verbose
-            )
+            with profile_tags(approach=approach, task=task_type, K=K, member=i):
+                res, model = task(
+                    X_test,
+                    X_train,
+                    model,
+                    task_type,
+                    subset=subset,
+                    verbose=verbose,
+                    **task_kwargs,
+                )
 
             if relative and approach != "Oracle":
                 X_test = X_gt.test()
@@ -330,6 +496,7 @@ def aggregate_predictive(
                         task_type,
                         subset=subset,
                         verbose=verbose,
+                        **task_kwargs,
                     )[0]
                 )
             res, std = meanstd(pd.concat(res, axis=0))
@@ -337,9 +504,16 @@ def aggregate_predictive(
 
         results.append(res)
         trained_models.append(model)
-        # save model to disk as pickle
-        if models is None and save:
-            pickle.dump(model, open(filename, "wb"))
+        if train_new and save:
+            store.put(i, model)
+
+        if callback is not None and callback(i, res):
+            break
+
+    # save all new models to disk at once
+    if save:
+        store.flush()
+    store.close()
 
     results = pd.concat(results, axis=0)
     if approach != "DGE_alternative":
@@ -351,6 +525,27 @@ def aggregate_predictive(
         return means, (stds**2 + stds2**2) ** 0.5, trained_models, None
 
 
+def load_or_fit_members(
+    X_trains, model_type, targettype, fileroot, load=True, save=True
+):
+    """
+    Load the members of a fused model type from their ModelStore under fileroot (see
+    fused_store), or fit and save them
+    """
+    with fused_store(fileroot) as store:
+        models = store.get(FUSED_KEY) if load else None
+        if models is not None and len(models) >= len(X_trains):
+            return models
+
+        models = fit_members(
+            X_trains, model_type, targettype, derive_seed(path_key(fileroot))
+        )
+        if save:
+            store.put(FUSED_KEY, models)
+            store.flush()
+    return models
+
+
 def meanstd(A):
     if type(A) == pd.DataFrame:
         return A.mean(axis=0).to_frame().T, A.std(axis=0).to_frame().T
@@ -369,44 +564,167 @@ def aggregate(
     workspace_folder=None,
     filename="",
     verbose=False,
+    warm_start=False,
+    warm_iter=None,
 ):
     """
     aggregate predictions from different synthetic datasets
+
+    With warm_start, members after the first start from the first member's fitted
+    parameters and train for warm_iter more iterations (see warm_start_fit).
     """
 
     results = []
     trained_models = []
     fileroot = f"{workspace_folder}/{task.__name__}_{task_type}"
+    if warm_start:
+        # warm_iter changes the fitted models, so it is part of the cache key
+        fileroot += "_warm" if warm_iter is None else f"_warm{warm_iter}"
 
     if (save or load) and not os.path.exists(fileroot):
         os.makedirs(fileroot)
 
+    if models is None and task_type in FUSED_MODEL_TYPES:
+        models = load_or_fit_members(
+            X_syns,
+            task_type,
+            X_syns[0].targettype,
+            f"{fileroot}_{filename}",
+            load=load,
+            save=save,
+        )
+
+    # all members are cached in one bundle, see DGE_artifacts
+    store = ModelStore(
+        f"{fileroot}_{filename}.dge",
+        legacy_filename=lambda i: f"{fileroot}_{filename}_{i}.pkl",
+    )
+    if load and models is None:
+        # load the next members while the current one is trained or evaluated
+        store.prefetch(range(len(X_syns)))
+
     for i in range(len(X_syns)):
-        full_filename = f"{fileroot}_{filename}_{i}.pkl"
         if models is None:
             if verbose:
-                print(f"Saving model as {full_filename}")
+                print(f"Saving model in {store.path}")
 
-            if os.path.exists(full_filename) and load:
-                model = pickle.load(open(full_filename, "rb"))
-            else:
-                model = None
-                if verbose:
-                    print(f"Train model {i+1}/{len(X_syns)}")
-                reproducibility.enable_reproducible_results()
+            model = store.get(i) if load else None
+            if model is None and verbose:
+                print(f"Train model {i+1}/{len(X_syns)}")
         else:
             model = models[i]
+        train_new = models is None and model is None
 
-        res, model = task(X_gt, X_syns[i], model, task_type, verbose)
+        # seeded by where the member is cached, see aggregate_predictive
+        task_kwargs = {"random_state": derive_seed(path_key(fileroot), filename, i)}
+        if warm_start and i > 0:
+            task_kwargs.update(init=trained_models[0], warm_iter=warm_iter)
+
+        with profile_tags(task=task_type, ensemble=filename, member=i):
+            res, model = task(X_gt, X_syns[i], model, task_type, verbose, **task_kwargs)
         results.append(res)
         trained_models.append(model)
-        # save model to disk as pickle
-        if models is None and save:
-            pickle.dump(model, open(full_filename, "wb"))
+        if train_new and save:
+            store.put(i, model)
+
+    # save all new models to disk at once
+    if save:
+        store.flush()
+    store.close()
 
     return *meanstd(results), trained_models
 
 
+def aggregate_adaptive(
+    X_gt,
+    X_syns,
+    task=supervised_task,
+    task_type="",
+    max_members=20,
+    min_members=3,
+    tol=1e-3,
+    patience=2,
+    load=True,
+    save=True,
+    workspace_folder=None,
+    filename="",
+    verbose=False,
+):
+    """
+    aggregate, adding members one at a time until the predictions converge
+
+    X_syns may be lazy, e.g. iter_synthetic_data, so that the generators of members
+    that are not needed are never trained. After every member the mean absolute change
+    of the ensemble's predictive mean and std on X_gt is computed. The ensemble stops
+    growing once both changes are below tol for patience members in a row, and it has
+    at least min_members members.
+
+    Members are cached and seeded as in aggregate, so they are shared with it.
+
+    Returns:
+        y_pred_mean, y_pred_std, models, history (pd.DataFrame with the changes per
+        ensemble size K)
+    """
+    if task_type in FUSED_MODEL_TYPES:
+        raise ValueError(f"{task_type} trains all members at once, use aggregate")
+
+    fileroot = f"{workspace_folder}/{task.__name__}_{task_type}"
+    if (save or load) and not os.path.exists(fileroot):
+        os.makedirs(fileroot)
+
+    # all members are cached in one bundle, see DGE_artifacts
+    store = ModelStore(
+        f"{fileroot}_{filename}.dge",
+        legacy_filename=lambda i: f"{fileroot}_{filename}_{i}.pkl",
+    )
+    if load:
+        store.prefetch(range(max_members))
+
+    trained_models = []
+    history = []
+    sum_pred = sum_sq = mean = std = None
+    converged = 0
+    for i, X_syn in enumerate(X_syns):
+        if i >= max_members:
+            break
+        model = store.get(i) if load else None
+        train_new = model is None
+        task_kwargs = {"random_state": derive_seed(path_key(fileroot), filename, i)}
+        with profile_tags(task=task_type, ensemble=filename, member=i):
+            pred, model = task(
+                X_gt, as_dataset(X_syn), model, task_type, verbose, **task_kwargs
+            )
+        trained_models.append(model)
+        if train_new and save:
+            store.put(i, model)
+
+        # running moments, the same mean and std as meanstd
+        pred = np.asarray(pred, dtype=float)
+        sum_pred = pred if sum_pred is None else sum_pred + pred
+        sum_sq = pred**2 if sum_sq is None else sum_sq + pred**2
+        K = i + 1
+        prev_mean, prev_std = mean, std
+        mean = sum_pred / K
+        std = np.sqrt(np.maximum(sum_sq / K - mean**2, 0))
+        if prev_mean is None:
+            continue
+
+        delta_mean = np.mean(np.abs(mean - prev_mean))
+        delta_std = np.mean(np.abs(std - prev_std))
+        history.append({"K": K, "delta_mean": delta_mean, "delta_std": delta_std})
+        converged = converged + 1 if max(delta_mean, delta_std) < tol else 0
+        if verbose:
+            print(f"K={K}: mean changed {delta_mean:.2e}, std {delta_std:.2e}")
+        if K >= min_members and converged >= patience:
+            break
+
+    if save:
+        store.flush()
+    store.close()
+
+    return mean, std, trained_models, pd.DataFrame(history)
+
+
 def tsne(X):
     """
     Perform t-SNE dimensionality reduction to two dimensions
@@ -431,23 +749,34 @@ def aggregate_imshow(
     save=True,
     filename="",
     baseline_contour=None,
+    plot_queue=None,
 ):
     """
     Aggregate and plot predictions from different synthetic datasets, on a 2D space. E.g., density estimation, predictions.
+
+    With a plot_queue (see DGE_plotting), figures are rendered in the background
+    instead of shown inline.
     """
+    from deep_generative_ensemble.DGE_plotting import render_imshow, render_samples
 
-    xmin = ymin = np.min(X_gt.train().unpack(as_numpy=True)[0])
-    xmax = ymax = np.max(X_gt.train().unpack(as_numpy=True)[0])
+    X_gt = as_dataset(X_gt)
+    X_syns = [as_dataset(X_syn) for X_syn in X_syns]
+    X_train, y_train = X_gt.train().unpack(as_numpy=True)
+    xmin = ymin = np.min(X_train)
+    xmax = ymax = np.max(X_train)
+    extent = [xmin, xmax, ymin, ymax]
 
     steps = 400
     X_grid = np.linspace(xmin, xmax, steps)
     Y_grid = np.linspace(ymin, ymax, steps)
 
     X_grid, Y_grid = np.meshgrid(X_grid, Y_grid)
-    Z_grid = pd.DataFrame(np.c_[X_grid.ravel(), Y_grid.ravel()])
-    Z_grid["target"] = -1
-    Z_grid = GenericDataLoader(Z_grid, target_column="target", train_size=0.01)
-    Z_grid.targettype = X_syns[0].targettype
+    Z_grid = ArrayDataset(
+        np.c_[X_grid.ravel(), Y_grid.ravel()],
+        np.full(steps**2, -1),
+        targettype=X_syns[0].targettype,
+        train_size=0.01,
+    )
 
     y_pred_mean, y_pred_std, models = aggregate(
         Z_grid,
@@ -463,78 +792,31 @@ def aggregate_imshow(
 
     contour = [X_grid, Y_grid, y_pred_mean.reshape(steps, steps)]
 
-    for y, stat in zip((y_pred_mean, y_pred_std), ("mean", "std")):
-        fig = plt.figure(figsize=(3, 2.5), dpi=300, tight_layout=True)
-        ax = plt.axes()
-        if "oracle" in filename.lower():
-            plt.contour(
-                X_grid, Y_grid, contour[2], levels=[0.5], colors="w", linestyles=":"
-            )
-        else:
-            plt.contour(
-                X_grid, Y_grid, contour[2], levels=[0.5], colors="r", linestyles="--"
-            )
+    def render(func, path, *args, **kwargs):
+        if plot_queue is None:
+            func(path if save else None, *args, show=True, **kwargs)
+        elif save:
+            plot_queue.submit(func, path, *args, **kwargs)
 
-        if baseline_contour is not None:
-            plt.contour(
-                baseline_contour[0],
-                baseline_contour[1],
-                baseline_contour[2],
-                levels=[0.5],
-                colors="w",
-                linestyles=":",
-            )
-
-        im = ax.imshow(
-            y.reshape(steps, steps),
-            cmap="viridis",
-            extent=[xmin, xmax, ymin, ymax],
-            origin="lower",
+    filename_base = f"{results_folder}{task.__name__}_{task_type}_{filename}"
+    for y, stat in zip((y_pred_mean, y_pred_std), ("mean", "std")):
+        render(
+            render_imshow,
+            filename_base + stat + ".png",
+            (X_grid, Y_grid),
+            y,
+            contour,
+            extent,
+            oracle="oracle" in filename.lower(),
+            baseline_contour=baseline_contour,
         )
 
-        ax.set_aspect("equal", "box")
-
-        # if 'gaussian' in results_folder:
-        #     plt.vlines(0, ymin, ymax, colors='r', linestyles='dashed')
-
-        divider = make_axes_locatable(ax)
-        cax = divider.append_axes("right", size="5%", pad=0.05)
-        # cax = fig.add_axes([ax.get_position().x1+0.01,ax.get_position().y0,0.02,ax.get_position().height])
-        plt.colorbar(im, cax=cax)
-
-        if save:
-            filename_base = results_folder + f"{task.__name__}_{task_type}_{filename}"
-            filename_full = filename_base + stat + ".png"
-            print(f"Saving {filename_full}")
-            fig.savefig(f"{filename_full}", bbox_inches="tight")
-
-        plt.show()
-
-        X_train, y_train = X_gt.train().unpack(as_numpy=True)
-
     if len(np.unique(y_train)) == 2 and "oracle" in filename.lower():
-        fig = plt.figure(figsize=(3, 2.5), dpi=300, tight_layout=True)
-        ax = plt.axes()
-        ax.set_aspect("equal", "box")
-        plt.xlim(xmin, xmax)
-        plt.ylim(ymin, ymax)
-        y_train = y_train.astype(bool)
-        ax.scatter(X_train[:, 0], X_train[:, 1], c=y_train, marker=".")
-        plt.tight_layout()
-        # if 'gaussian' in results_folder:
-        #     plt.vlines(0, ymin, ymax, colors='r', linestyles='dashed')
-
-        if save:
-            fig.savefig(f"{filename_base}_samples.png", bbox_inches="tight")
-
-        plt.show()
+        render(render_samples, f"{filename_base}_samples.png", X_train, y_train, extent)
 
     return y_pred_mean, y_pred_std, models, contour
 
 
-# ####### paper/results/ formatting
-
-
 def get_folder_names(dataset, model_name, max_n, nsyn):
     workspace_folder = os.path.join(
         "workspace", dataset, model_name, f"nmax_{max_n}_nsyn_{nsyn}"
@@ -545,45 +827,26 @@ def get_folder_names(dataset, model_name, max_n, nsyn):
     return workspace_folder, results_folder
 
 
-def mean_across_pandas(dfs, precision=3):
-    dfs = pd.concat(dfs.values())
-    df_mean = dfs.groupby(level=0).mean()
-    df_mean = df_mean.round(precision)
-    print(df_mean.to_latex(float_format=lambda x: f"%.{precision}f" % x))
+def mean_across_pandas(dfs, precision=3, experiment="predictive"):
+    """Mean scores per approach across datasets, dfs is a dict dataset -> scores or a
+    ResultsStore"""
+    summary = DGE_reporting.summarize(dfs, experiment=experiment)
+    df_mean = DGE_reporting.table(summary).round(precision)
+    print(DGE_reporting.to_latex(df_mean, precision))
     return df_mean
 
 
 # use scores but report per dataset
-def metric_different_datasets(dfs, metric="AUC", to_print=True, precision=3):
-    df_all_datasets = pd.concat([score[metric] for score in dfs.values()], axis=1)
-    df_all_datasets.columns = dfs.keys()
-    df_all_datasets.round(precision)
-
-    for dataset in zip(
-        ["moons", "circles", "adult", "breast_cancer", "seer", "covid"][::-1],
-        ["Moons", "Circles", "Adult Income", "Breast Cancer", "SEER", "COVID-19"][::-1],
-    ):
-        try:
-            df_all_datasets.insert(0, dataset[1], df_all_datasets.pop(dataset[0]))
-        except BaseException:
-            continue
-    df_all_datasets["Mean"] = df_all_datasets.mean(axis=1)
+def metric_different_datasets(
+    dfs, metric="AUC", to_print=True, precision=3, experiment="predictive"
+):
+    df_all_datasets = DGE_reporting.metric_table(dfs, metric, experiment=experiment)
 
     if to_print:
-        print(df_all_datasets.to_latex(float_format=lambda x: f"%.{precision}f" % x))
+        print(DGE_reporting.to_latex(df_all_datasets, precision))
 
     return df_all_datasets
 
 
 def add_std(df, std, precision=3):
-    formatting_string = "{." + str(precision) + "f"
-    df = df.round(precision)
-    std = std.round(precision)
-    df.style.format(precision=3, formatter=formatting_string)
-    std.style.format(precision=3, formatter=formatting_string)
-    df = df.astype(str)
-    std = std.astype(str)
-    for column in df.columns:
-        if column in std.columns:
-            df[column] = df[column] + " ± " + std[column]
-    return df
+    return DGE_reporting.format_mean_std(df, std, precision)
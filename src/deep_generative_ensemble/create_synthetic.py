@@ -1,14 +1,16 @@
+from deep_generative_ensemble.DGE_generators import plugins
+
 # third party
 import torch
 from DGE_data import get_real_and_synthetic
 
 # synthcity absolute
-from synthcity.plugins import Plugins
 from synthcity.utils import reproducibility
 
 reproducibility.clear_cache()
 device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-Plugins(categories=["generic"]).list()
+# discover the plugins once, in the registry that make_generator uses
+plugins().list()
 
 assert device.type == "cuda"
 
@@ -0,0 +1,119 @@
+# third party
+import numpy as np
+import pandas as pd
+
+# Large raw CSVs are read in chunks, each filtered and transformed on its own, and rows
+# are sampled on the fly, so that memory scales with the sample and not the file.
+CHUNKSIZE = 100_000
+
+
+def iter_chunks(path, transform=None, chunksize=CHUNKSIZE, **read_csv_kwargs):
+    """Chunks of the CSV at path, passed through transform, e.g. a filter"""
+    for chunk in pd.read_csv(path, chunksize=chunksize, **read_csv_kwargs):
+        if transform is not None:
+            chunk = transform(chunk)
+        yield chunk
+
+
+def _by_stratum(chunk, strata):
+    if strata is None:
+        return {None: chunk}
+    return dict(tuple(chunk.groupby(strata, sort=False)))
+
+
+def sample_csv(
+    path,
+    n,
+    transform=None,
+    strata=None,
+    sampling="exact",
+    random_state=42,
+    chunksize=CHUNKSIZE,
+    **read_csv_kwargs,
+):
+    """Sample n rows (after transform) of the CSV at path without loading all of it.
+
+    Args:
+        path (str): CSV file.
+        n (int): Rows per stratum, None for all rows.
+        transform (callable, optional): Applied to every chunk, e.g. a filter.
+        strata (str, optional): Column to sample n rows of every value of.
+        sampling (str, optional): "exact" reads the file twice, once to count the
+            rows, and gives the rows of df.sample(n, random_state=random_state).
+            "reservoir" reads it once and keeps the n rows with the smallest random
+            keys, a uniform sample too but a different one. Defaults to "exact".
+        random_state (int, optional): Seed. Defaults to 42.
+        **read_csv_kwargs: e.g. usecols and dtype.
+
+    Returns:
+        pd.DataFrame, or dict stratum -> pd.DataFrame if strata is given
+    """
+
+    def chunks():
+        return iter_chunks(path, transform, chunksize, **read_csv_kwargs)
+
+    if n is None:
+        samples = {}
+        for chunk in chunks():
+            for stratum, part in _by_stratum(chunk, strata).items():
+                samples.setdefault(stratum, []).append(part)
+    elif sampling == "exact":
+        samples = _sample_exact(chunks, n, strata, random_state)
+    elif sampling == "reservoir":
+        samples = _sample_reservoir(chunks(), n, strata, random_state)
+    else:
+        raise ValueError(f"Unknown sampling {sampling}")
+
+    samples = {stratum: pd.concat(parts) for stratum, parts in samples.items()}
+    return samples if strata is not None else samples[None]
+
+
+def _sample_exact(chunks, n, strata, random_state):
+    counts = {}
+    for chunk in chunks():
+        for stratum, part in _by_stratum(chunk, strata).items():
+            counts[stratum] = counts.get(stratum, 0) + len(part)
+
+    # positions and order of the rows df.sample draws, a fresh RandomState per stratum
+    ranks = {
+        stratum: pd.Series(
+            np.arange(n),
+            index=np.random.RandomState(random_state).choice(count, n, replace=False),
+        )
+        for stratum, count in counts.items()
+    }
+
+    offsets = dict.fromkeys(counts, 0)
+    samples = {stratum: [] for stratum in counts}
+    for chunk in chunks():
+        for stratum, part in _by_stratum(chunk, strata).items():
+            positions = offsets[stratum] + np.arange(len(part))
+            offsets[stratum] += len(part)
+            rank = ranks[stratum].reindex(positions).to_numpy()
+            taken = ~np.isnan(rank)
+            samples[stratum].append(part[taken].assign(_rank=rank[taken]))
+
+    return {
+        stratum: [pd.concat(parts).sort_values("_rank").drop(columns="_rank")]
+        for stratum, parts in samples.items()
+    }
+
+
+def _sample_reservoir(chunks, n, strata, random_state):
+    rng = np.random.default_rng(random_state)
+    reservoirs = {}
+    for chunk in chunks:
+        for stratum, part in _by_stratum(chunk, strata).items():
+            part = part.assign(_key=rng.random(len(part)))
+            if stratum in reservoirs:
+                part = pd.concat([reservoirs[stratum], part])
+            if len(part) > n:
+                part = part.iloc[np.argpartition(part["_key"].to_numpy(), n)[:n]]
+            reservoirs[stratum] = part
+
+    samples = {}
+    for stratum, part in reservoirs.items():
+        if len(part) < n:
+            raise ValueError(f"Only {len(part)} rows in stratum {stratum}, need {n}")
+        samples[stratum] = [part.sort_values("_key").drop(columns="_key")]
+    return samples
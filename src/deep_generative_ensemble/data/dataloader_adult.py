@@ -3,19 +3,33 @@ import numpy as np
 import pandas as pd
 from sklearn.preprocessing import LabelEncoder
 
+NUMERIC_DTYPES = {
+    "age": np.int16,
+    "fnlwgt": np.int32,
+    "education.num": np.int8,
+    "capital.gain": np.int32,
+    "capital.loss": np.int32,
+    "hours.per.week": np.int16,
+}
+
 
 def load_adult_census(as_frame=True, path="data/adult.csv"):
     try:
-        df = pd.read_csv(path, encoding="latin-1")
+        # education is not read, it is already encoded in education.num
+        df = pd.read_csv(
+            path,
+            encoding="latin-1",
+            usecols=lambda column: column != "education",
+            na_values=[" ?"],
+            dtype=NUMERIC_DTYPES,
+        )
     except BaseException:
         raise FileNotFoundError("Could not find adult.csv in data folder.")
-    df[df == " ?"] = np.nan
     for col in ["workclass", "occupation", "native.country"]:
-        df[col].fillna(df[col].mode()[0], inplace=True)
+        df[col] = df[col].fillna(df[col].mode()[0])
 
     df["income"] = df["income"].map({"<=50K": 0, ">50K": 1})
-    # drop education because it is already encoded in education.num
-    X, y = df.drop(["income", "education"], axis=1), df["income"]
+    X, y = df.drop(columns="income"), df["income"]
     categorical = [
         "workclass",
         "marital.status",
@@ -28,7 +42,7 @@ def load_adult_census(as_frame=True, path="data/adult.csv"):
 
     for feature in categorical:
         le = LabelEncoder()
-        X[feature] = le.fit_transform(X[feature])
+        X[feature] = le.fit_transform(X[feature]).astype(np.int8)
 
     if as_frame:
         X = pd.DataFrame(X)
@@ -1,13 +1,46 @@
+# stdlib
+import os
+
+from deep_generative_ensemble.data.chunked_csv import sample_csv
+
 # third party
-import pandas as pd
+import numpy as np
+
+# columns with too many missing values, never read
+DROPPED = ["INTUBED", "ICU"]
+# all other columns but AGE and DATE_DIED are small integer codes
+CODES = [
+    "USMER",
+    "MEDICAL_UNIT",
+    "SEX",
+    "PATIENT_TYPE",
+    "PNEUMONIA",
+    "PREGNANT",
+    "DIABETES",
+    "COPD",
+    "ASTHMA",
+    "INMSUPR",
+    "HIPERTENSION",
+    "OTHER_DISEASE",
+    "CARDIOVASCULAR",
+    "OBESITY",
+    "RENAL_CHRONIC",
+    "TOBACCO",
+    "CLASIFFICATION_FINAL",
+]
+DTYPES = {**dict.fromkeys(CODES, np.int8), "AGE": np.int16, "DATE_DIED": str}
+
 
+def load_covid(relative_path="data/covid_data.csv", reduce_to=None, sampling="exact"):
+    """Covid data, filtered and sampled while reading the CSV in chunks.
 
-def load_covid(relative_path="data/covid_data.csv", reduce_to=None):
+    sampling="exact" gives the sample of the in-memory implementation,
+    covid.sample(n=reduce_to, random_state=42), "reservoir" reads the file once only
+    (see sample_csv).
+    """
     # from https://www.kaggle.com/code/imzeepo/covid-19-logistic-regression-random-forest
 
-    try:
-        covid = pd.read_csv(relative_path)
-    except FileNotFoundError:
+    if not os.path.exists(relative_path):
         raise FileNotFoundError(
             "Could not find Covid Data.csv in data folder. Download from https://www.kaggle.com/datasets/meirnizri/covid19-dataset"
         )
@@ -54,17 +87,22 @@ def load_covid(relative_path="data/covid_data.csv", reduce_to=None):
         "TOBACCO",
     ]
 
-    for col in cols:
-        covid = covid[(covid[col] == 1) | (covid[col] == 2)]
-
-    covid["target"] = [2 if row == "9999-99-99" else 1 for row in covid["DATE_DIED"]]
-
-    covid.drop(columns=["INTUBED", "ICU", "DATE_DIED"], inplace=True)
-
-    # 'DATE_DIED' column to binary 'target' column
+    def transform(chunk):
+        mask = np.logical_and.reduce([chunk[col].isin([1, 2]) for col in cols])
+        chunk = chunk[mask]
+        # 'DATE_DIED' column to binary 'target' column
+        target = np.where(chunk["DATE_DIED"] == "9999-99-99", 2, 1)
+        return chunk.drop(columns="DATE_DIED").assign(target=target)
 
-    if reduce_to is not None:
-        covid = covid.sample(n=reduce_to, replace=False, random_state=42)
+    covid = sample_csv(
+        relative_path,
+        reduce_to,
+        transform=transform,
+        sampling=sampling,
+        random_state=42,
+        usecols=lambda column: column not in DROPPED,
+        dtype=DTYPES,
+    )
     y = covid["target"]
     x = covid.drop("target", axis=1)
 
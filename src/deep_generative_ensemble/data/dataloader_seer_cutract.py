@@ -1,55 +1,37 @@
+from deep_generative_ensemble.data.chunked_csv import sample_csv
+
 # third party
+import numpy as np
 import pandas as pd
 import sklearn
 
-
-def load_seer_cutract(name="seer", reduce_to=20000, seed=42):
-    def aggregate_grade(row):
-        if row["grade_1.0"] == 1:
-            return 1
-        if row["grade_2.0"] == 1:
-            return 2
-        if row["grade_3.0"] == 1:
-            return 3
-        if row["grade_4.0"] == 1:
-            return 4
-        if row["grade_5.0"] == 1:
-            return 5
-
-    def aggregate_stage(row):
-        if row["stage_1"] == 1:
-            return 1
-        if row["stage_2"] == 1:
-            return 2
-        if row["stage_3"] == 1:
-            return 3
-        if row["stage_4"] == 1:
-            return 4
-        if row["stage_5"] == 1:
-            return 5
-
-    def aggregate_treatment(row):
-        if row["treatment_CM"] == 1:
-            return 1
-        if row["treatment_Primary hormone therapy"] == 1:
-            return 2
-        if row["treatment_Radical Therapy-RDx"] == 1:
-            return 3
-        if row["treatment_Radical therapy-Sx"] == 1:
-            return 4
-
-    features = [
-        "age",
-        "psa",
-        "comorbidities",
+# one-hot columns -> aggregated column, the code of a row is the position of its first
+# one, counting from 1
+ONE_HOT = {
+    "grade": ["grade_1.0", "grade_2.0", "grade_3.0", "grade_4.0", "grade_5.0"],
+    "stage": ["stage_1", "stage_2", "stage_3", "stage_4", "stage_5"],
+    "treatment": [
         "treatment_CM",
         "treatment_Primary hormone therapy",
         "treatment_Radical Therapy-RDx",
         "treatment_Radical therapy-Sx",
-        "grade",
-        "stage",
-    ]
+    ],
+}
+NUMERIC = ["age", "psa", "comorbidities"]
 
+
+def _aggregate(df, columns):
+    return np.select(
+        [df[column] == 1 for column in columns], range(1, len(columns) + 1), np.nan
+    )
+
+
+def load_seer_cutract(name="seer", reduce_to=20000, seed=42, sampling="exact"):
+    """SEER or CUTRACT data with as many dead as surviving patients.
+
+    The CSV is read in chunks, only the columns that are used, and sampled per class
+    on the fly, see sample_csv.
+    """
     features = [
         "age",
         "psa",
@@ -62,47 +44,34 @@ def load_seer_cutract(name="seer", reduce_to=20000, seed=42):
     # features = ['age', 'psa', 'comorbidities', 'treatment_CM', 'treatment_Primary hormone therapy',
     #         'treatment_Radical Therapy-RDx', 'treatment_Radical therapy-Sx', 'grade', 'stage']
     label = "mortCancer"
-    df = pd.read_csv(f"./data/{name}.csv")
 
-    df["grade"] = df.apply(aggregate_grade, axis=1)
-    df["stage"] = df.apply(aggregate_stage, axis=1)
-    df["treatment"] = df.apply(aggregate_treatment, axis=1)
-    df["mortCancer"] = df["mortCancer"].astype(int)
-    df["mort"] = df["mort"].astype(int)
+    def transform(chunk):
+        aggregated = {
+            feature: _aggregate(chunk, columns) for feature, columns in ONE_HOT.items()
+        }
+        chunk = chunk.assign(**aggregated)
+        chunk[label] = chunk[label].astype(int)
+        return chunk[features + [label]]
 
-    mask = df[label] is True
-    df_dead = df[mask]
-    df_survive = df[~mask]
+    samples = sample_csv(
+        f"./data/{name}.csv",
+        None if reduce_to is None else reduce_to // 2,
+        transform=transform,
+        strata=label,
+        sampling=sampling,
+        random_state=seed,
+        usecols=NUMERIC + sum(ONE_HOT.values(), []) + [label],
+        dtype=dict.fromkeys(NUMERIC, np.float32),
+    )
+    df_dead = samples.get(1, pd.DataFrame(columns=features + [label]))
+    df_survive = samples.get(0, pd.DataFrame(columns=features + [label]))
 
     if reduce_to is None:
         n_samples = min([len(df_dead), len(df_survive)])
-    else:
-        n_samples = reduce_to // 2
-
-    # if n_samples > len(df_dead):
-    #     replace_dead = True
-    # else:
-    #     replace_dead = False
-
-    # if n_samples > len(df_survive):
-    #     replace_survive = True
-    # else:
-    #     replace_survive = False
-
-    # df = pd.concat(
-    #     [
-    #         df_dead.sample(n_samples, random_state=seed, replace=replace_dead),
-    #         df_survive.sample(n_samples, random_state=seed, replace=replace_survive),
-    #     ]
-    # )
-
-    df = pd.concat(
-        [
-            df_dead.sample(n_samples, random_state=seed),
-            df_survive.sample(n_samples, random_state=seed),
-        ]
-    )
+        df_dead = df_dead.sample(n_samples, random_state=seed)
+        df_survive = df_survive.sample(n_samples, random_state=seed)
 
+    df = pd.concat([df_dead, df_survive])
     df = sklearn.utils.shuffle(df, random_state=seed)
     df = df.reset_index(drop=True)
     return df[features], df[label]
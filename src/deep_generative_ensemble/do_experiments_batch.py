@@ -1,16 +1,20 @@
+from deep_generative_ensemble.DGE_generators import plugins
+
 # third party
 import torch
 from DGE_data import get_real_and_synthetic
 from DGE_experiments import model_evaluation_experiment, predictive_experiment
+from DGE_plotting import PlotQueue
+from DGE_results import ResultsStore
 from DGE_utils import get_folder_names
 
 # synthcity absolute
-from synthcity.plugins import Plugins
 from synthcity.utils import reproducibility
 
 reproducibility.clear_cache()
 device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-Plugins(categories=["generic"]).list()
+# discover the plugins once, in the registry that make_generator uses
+plugins().list()
 
 assert device.type == "cuda"
 
@@ -32,57 +36,66 @@ save = True  # save results and data
 
 verbose = False
 
+# render figures in background processes, so the batch does not wait for matplotlib,
+# and append all scores to results/results.sqlite. Both are closed even if a run fails
+with PlotQueue() as plot_queue, ResultsStore() as results_store:
+    for nsyn in [2000, 5000]:
+        for max_n in [2000, 5000, 10000]:  # , 5000, 10000]:
+            if max_n > nsyn:
+                continue
+            for dataset in datasets:  # datasets:
+                for model_name in ["ctgan_deep", "ctgan", "ctgan_shallow"]:
+                    print("Dataset:", dataset)
 
-for nsyn in [2000, 5000]:
-    for max_n in [2000, 5000, 10000]:  # , 5000, 10000]:
-        if max_n > nsyn:
-            continue
-        for dataset in datasets:  # datasets:
-            for model_name in ["ctgan_deep", "ctgan", "ctgan_shallow"]:
-                print("Dataset:", dataset)
-
-                workspace_folder, results_folder = get_folder_names(
-                    dataset, model_name, max_n=max_n, nsyn=nsyn
-                )
+                    workspace_folder, results_folder = get_folder_names(
+                        dataset, model_name, max_n=max_n, nsyn=nsyn
+                    )
 
-                X_gt, X_syns = get_real_and_synthetic(
-                    dataset=dataset,
-                    p_train=p_train,
-                    n_models=n_models,
-                    model_name=model_name,
-                    load_syn=load_syn,
-                    verbose=verbose,
-                    max_n=max_n,
-                )
+                    X_gt, X_syns = get_real_and_synthetic(
+                        dataset=dataset,
+                        p_train=p_train,
+                        n_models=n_models,
+                        model_name=model_name,
+                        load_syn=load_syn,
+                        verbose=verbose,
+                        max_n=max_n,
+                    )
+                    config_store = results_store.with_keys(
+                        dataset=dataset, generator=model_name, max_n=max_n, nsyn=nsyn
+                    )
 
-                y_preds, scores = predictive_experiment(
-                    X_gt,
-                    X_syns,
-                    workspace_folder=workspace_folder,
-                    results_folder=results_folder,
-                    save=save,
-                    load=load,
-                    plot=True,
-                )
+                    y_preds, scores = predictive_experiment(
+                        X_gt,
+                        X_syns,
+                        workspace_folder=workspace_folder,
+                        results_folder=results_folder,
+                        save=save,
+                        load=load,
+                        plot=True,
+                        plot_queue=plot_queue,
+                        results_store=config_store,
+                    )
 
-                means, std = model_evaluation_experiment(
-                    X_gt,
-                    X_syns,
-                    workspace_folder=workspace_folder,
-                    relative="",
-                    model_type="deepish_mlp",
-                    load=load,
-                    save=load,
-                    verbose=verbose,
-                )
+                    means, std = model_evaluation_experiment(
+                        X_gt,
+                        X_syns,
+                        workspace_folder=workspace_folder,
+                        relative="",
+                        model_type="deepish_mlp",
+                        load=load,
+                        save=load,
+                        verbose=verbose,
+                        results_store=config_store,
+                    )
 
-                means, std = model_evaluation_experiment(
-                    X_gt,
-                    X_syns,
-                    workspace_folder=workspace_folder,
-                    relative="",
-                    model_type="mlp",
-                    load=load,
-                    save=load,
-                    verbose=verbose,
-                )
+                    means, std = model_evaluation_experiment(
+                        X_gt,
+                        X_syns,
+                        workspace_folder=workspace_folder,
+                        relative="",
+                        model_type="mlp",
+                        load=load,
+                        save=load,
+                        verbose=verbose,
+                        results_store=config_store,
+                    )
@@ -0,0 +1,76 @@
+from deep_generative_ensemble import DGE_serialization
+from deep_generative_ensemble.DGE_artifacts import Bundle, ModelStore
+
+# third party
+import numpy as np
+import pytest
+
+
+def member(k):
+    return {"k": k, "weights": np.full((50, 20), k, dtype=np.float32)}
+
+
+def assert_members(path, keys):
+    with ModelStore(path) as store:
+        for k in keys:
+            np.testing.assert_array_equal(store.get(k)["weights"], member(k)["weights"])
+
+
+@pytest.mark.parametrize("depth", [0, 1, 3])
+def test_put_flush_and_append(tmp_path, depth):
+    path = str(tmp_path / "models" / "members.dge")
+    with ModelStore(path, depth=depth) as store:
+        for k in range(5):
+            store.put(k, member(k))
+        # unflushed members are served from memory
+        assert store.get(4)["k"] == 4
+        store.flush()
+    assert_members(path, range(5))
+
+    # members are appended to the existing bundle, replacing members of the same key
+    with ModelStore(path, depth=depth) as store:
+        store.prefetch(range(5))
+        store.put(5, member(5))
+        store.put(0, member(0) | {"k": "replaced"})
+        assert store.get(1)["k"] == 1
+        store.flush()
+    assert_members(path, range(1, 6))
+    with ModelStore(path) as store:
+        assert store.get(0)["k"] == "replaced"
+
+    with Bundle(path) as bundle:
+        assert sorted(bundle.keys()) == list(range(6))
+        assert bundle.load_all()[3]["k"] == 3
+
+
+def test_unflushed_members_are_not_written(tmp_path):
+    path = str(tmp_path / "members.dge")
+    with ModelStore(path) as store:
+        store.put(0, member(0))
+    # the temporary file of the new bundle is removed
+    assert list(tmp_path.iterdir()) == []
+
+    with ModelStore(path) as store:
+        store.put(0, member(0))
+        store.flush()
+    with ModelStore(path) as store:
+        store.put(1, member(1))
+    # appended members without an index leave the bundle as it was
+    with ModelStore(path) as store:
+        assert store.get(1) is None
+    assert_members(path, [0])
+
+
+def test_legacy_files_are_read(tmp_path):
+    DGE_serialization.dump(member(0), str(tmp_path / "member_0.pkl"))
+    path = str(tmp_path / "members.dge")
+
+    def legacy_filename(k):
+        return str(tmp_path / f"member_{k}.pkl")
+
+    with ModelStore(path, legacy_filename=legacy_filename) as store:
+        assert store.get(0)["k"] == 0
+        assert store.get(1) is None
+        store.put(1, member(1))
+        store.flush()
+    assert_members(path, [1])
@@ -0,0 +1,49 @@
+# stdlib
+from functools import lru_cache
+
+from deep_generative_ensemble.DGE_benchmarks import (
+    APPROACHES,
+    BENCHMARK_DATASETS,
+    benchmark_cases,
+    benchmark_inputs,
+)
+
+# third party
+import pytest
+
+# the real datasets and the stub synthetic datasets are synthcity DataLoaders
+pytest.importorskip("synthcity")
+
+CASES = (
+    ["compute_metrics", "accuracy_confidence_curve", "cat_dl", "aggregate"]
+    + [f"aggregate_predictive[{approach}]" for approach in APPROACHES]
+    + ["cross_val"]
+)
+
+# (n, K, d): training rows per dataset, number of synthetic datasets, features
+SIZES = [(500, 5, 2), (2000, 20, 10)]
+
+
+@lru_cache(maxsize=None)
+def inputs(dataset, n, K, d):
+    return benchmark_inputs(dataset, n, K, d)
+
+
+@pytest.fixture(scope="module")
+def workspace_folder(tmp_path_factory):
+    return str(tmp_path_factory.mktemp("workspace"))
+
+
+@pytest.mark.parametrize("n, K, d", SIZES, ids=[f"n{n}-K{K}-d{d}" for n, K, d in SIZES])
+@pytest.mark.parametrize("dataset", BENCHMARK_DATASETS)
+@pytest.mark.parametrize("case", CASES)
+def test_hot_path(benchmark, workspace_folder, case, dataset, n, K, d):
+    X_gt, X_syns = inputs(dataset, n, K, d)
+    cases = benchmark_cases(X_gt, X_syns, "lr", workspace_folder)
+    if case not in cases:
+        pytest.skip(f"{case} needs at least 20 synthetic datasets")
+
+    benchmark.group = case
+    benchmark.extra_info.update(dataset=dataset, n=n, K=K, d=d)
+    benchmark.pedantic(cases[case], rounds=3, iterations=1)
+    benchmark.extra_info["rows_per_s"] = n * K / benchmark.stats.stats.min
@@ -0,0 +1,62 @@
+from deep_generative_ensemble.DGE_compile import compile_ensemble, predict_members_loop
+from deep_generative_ensemble.DGE_utils import init_model
+
+# third party
+import numpy as np
+import pytest
+
+K = 3
+
+pytestmark = pytest.mark.filterwarnings("ignore::sklearn.exceptions.ConvergenceWarning")
+
+
+def fitted_members(model_type, targettype, n=200, d=5, seed=0):
+    rng = np.random.default_rng(seed)
+    X = rng.standard_normal((n, d)) * rng.uniform(0.5, 5, d) + rng.uniform(-3, 3, d)
+    logits = X @ rng.standard_normal(d)
+    y = logits > np.median(logits) if targettype == "classification" else logits
+
+    # few epochs, the test is about equivalence, not fit
+    params = {} if model_type == "lr" else {"max_iter": 50}
+    members = []
+    for k in range(K):
+        # every member on its own bootstrap, as DGE members differ in their data
+        idx = rng.integers(0, n, n)
+        model = init_model(model_type, targettype, random_state=k, **params)
+        members.append(model.fit(X[idx], y[idx]))
+    return members, X
+
+
+@pytest.mark.parametrize("targettype", ["classification", "regression"])
+@pytest.mark.parametrize("model_type", ["lr", "smallest_mlp", "deepish_mlp"])
+def test_compiled_matches_members(model_type, targettype):
+    members, X = fitted_members(model_type, targettype)
+
+    expected = predict_members_loop(members, X, targettype)
+    compiled = compile_ensemble(members, targettype)
+
+    assert compiled.predict_members(X).shape == (K, len(X))
+    np.testing.assert_allclose(
+        compiled.predict_members(X), expected, rtol=1e-6, atol=1e-8
+    )
+
+    mean, std = compiled.predict_mean_std(X)
+    np.testing.assert_allclose(mean, expected.mean(axis=0), rtol=1e-6, atol=1e-8)
+    np.testing.assert_allclose(std, expected.std(axis=0), rtol=1e-6, atol=1e-8)
+
+
+def test_compiled_float32_matches_members():
+    members, X = fitted_members("smallest_mlp", "classification")
+    compiled = compile_ensemble(members, "classification", dtype=np.float32)
+    np.testing.assert_allclose(
+        compiled.predict_members(X),
+        predict_members_loop(members, X, "classification"),
+        atol=1e-4,
+    )
+
+
+def test_compile_rejects_mixed_architectures():
+    small, _ = fitted_members("smallest_mlp", "classification")
+    deep, _ = fitted_members("deepish_mlp", "classification")
+    with pytest.raises(ValueError):
+        compile_ensemble(small + deep)
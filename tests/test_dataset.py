@@ -0,0 +1,47 @@
+from deep_generative_ensemble.DGE_dataset import ArrayDataset
+
+# third party
+import numpy as np
+import pandas as pd
+import pytest
+
+
+def frame(targettype, n=101, seed=0):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame(rng.standard_normal((n, 3)), columns=["a", "b", "c"])
+    if targettype == "classification":
+        # imbalanced, so an unstratified split would differ
+        df["target"] = rng.uniform(size=n) < 0.2
+    else:
+        df["target"] = rng.standard_normal(n)
+    return df
+
+
+@pytest.mark.parametrize("targettype", ["classification", "regression"])
+def test_split_matches_generic_data_loader(targettype):
+    dataloader = pytest.importorskip("synthcity.plugins.core.dataloader")
+
+    df = frame(targettype)
+    loader = dataloader.GenericDataLoader(
+        df, target_column="target", train_size=0.8, random_state=3
+    )
+    dataset = ArrayDataset.from_loader(loader)
+
+    for ours, theirs in [
+        (dataset.train(), loader.train()),
+        (dataset.test(), loader.test()),
+    ]:
+        X, y = theirs.unpack(as_numpy=True)
+        np.testing.assert_allclose(ours.X, X, rtol=1e-6)
+        np.testing.assert_array_equal(ours.y, y)
+
+
+def test_split_is_stratified_and_keeps_target_dtype():
+    df = frame("classification")
+    dataset = ArrayDataset.from_frame(df, train_size=0.5, random_state=0)
+
+    assert dataset.y.dtype == bool
+    assert dataset.train().y.dtype == bool
+    assert dataset.unpack()[1].dtype == bool
+    # stratified, both halves have the same share of positives, up to one row
+    assert abs(dataset.train().y.sum() - dataset.test().y.sum()) <= 1
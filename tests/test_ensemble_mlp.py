@@ -0,0 +1,72 @@
+# third party
+import numpy as np
+import pytest
+
+torch = pytest.importorskip("torch")
+
+from deep_generative_ensemble.DGE_ensemble_mlp import EnsembleMLP  # noqa: E402
+
+K = 3
+
+
+def member_datasets(targettype, n=150, d=4, seed=0):
+    rng = np.random.default_rng(seed)
+    w = rng.standard_normal(d)
+    Xs, ys = [], []
+    for k in range(K):
+        # members get datasets of their own, of different sizes and scales
+        X = rng.standard_normal((n + 10 * k, d)) * (k + 1) + k
+        logits = (X - k) @ w
+        ys.append(logits > 0 if targettype == "classification" else logits)
+        Xs.append(X.astype(np.float32))
+    return Xs, ys
+
+
+def forward_member(model, k, X):
+    """Raw output of member k on its own, in numpy"""
+    h = (X - model.mean_[k]) / model.scale_[k]
+    n_layers = len(model.weights_) // 2
+    for j in range(n_layers):
+        W = model.weights_[2 * j][k].numpy()
+        b = model.weights_[2 * j + 1][k].numpy()
+        h = h @ W + b
+        if j < n_layers - 1:
+            h = np.maximum(h, 0)
+    return h
+
+
+@pytest.mark.parametrize("hidden_layer_sizes", [(8,), (8, 8)])
+def test_fused_matches_members_classification(hidden_layer_sizes):
+    Xs, ys = member_datasets("classification")
+    # few epochs, the test is about equivalence, not fit
+    model = EnsembleMLP(hidden_layer_sizes=hidden_layer_sizes, max_iter=5)
+    model.fit(Xs, ys)
+
+    for k in range(K):
+        np.testing.assert_allclose(model.mean_[k, 0], Xs[k].mean(axis=0), rtol=1e-5)
+
+    X = Xs[0][:50]
+    proba = model.predict_proba(X)
+    assert proba.shape == (K, len(X), 2)
+    for k, member in enumerate(model.members()):
+        p = 1 / (1 + np.exp(-forward_member(model, k, X)))
+        expected = np.concatenate([1 - p, p], axis=-1)
+        np.testing.assert_allclose(proba[k], expected, rtol=1e-4, atol=1e-6)
+        np.testing.assert_allclose(member.predict_proba(X), expected, atol=1e-6)
+        np.testing.assert_array_equal(
+            member.predict(X), model.classes_[expected.argmax(axis=-1)]
+        )
+
+
+def test_fused_matches_members_regression():
+    Xs, ys = member_datasets("regression")
+    model = EnsembleMLP("regression", hidden_layer_sizes=(8,), max_iter=5)
+    model.fit(Xs, ys)
+
+    X = Xs[1][:50]
+    pred = model.predict(X)
+    assert pred.shape == (K, len(X))
+    for k, member in enumerate(model.members()):
+        expected = forward_member(model, k, X)[:, 0]
+        np.testing.assert_allclose(pred[k], expected, rtol=1e-4, atol=1e-5)
+        np.testing.assert_allclose(member.predict(X), expected, rtol=1e-4, atol=1e-5)
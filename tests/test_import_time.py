@@ -0,0 +1,55 @@
+# stdlib
+import os
+import subprocess
+import sys
+
+import deep_generative_ensemble
+from deep_generative_ensemble.DGE_benchmarks import HEAVY_MODULES, IMPORT_BUDGETS
+
+# third party
+import pytest
+
+
+def run_fresh(*args):
+    """Run a fresh interpreter with args, on the source tree under test"""
+    src = os.path.dirname(os.path.dirname(deep_generative_ensemble.__file__))
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [src, env.get("PYTHONPATH")]))
+    return subprocess.run(
+        [sys.executable, *args], capture_output=True, text=True, check=True, env=env
+    )
+
+
+def import_times(module):
+    """Cumulative import time (s) of every module imported by importing module in a
+    fresh interpreter, from -X importtime"""
+    out = run_fresh("-X", "importtime", "-c", f"import {module}")
+
+    times = {}
+    for line in out.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        times[name.strip()] = int(cumulative) / 1e6
+    return times
+
+
+@pytest.mark.parametrize("module", list(IMPORT_BUDGETS))
+def test_import_time_budget(module):
+    # the best of a few runs, the first also compiles bytecode
+    runs = [import_times(module) for _ in range(3)]
+    seconds = min(times[module] for times in runs)
+    assert seconds <= IMPORT_BUDGETS[module], f"{module} took {seconds:.2f}s"
+
+    heavy = {name.split(".")[0] for name in runs[0]} & set(HEAVY_MODULES)
+    assert not heavy, f"{module} imports {sorted(heavy)}"
+
+
+@pytest.mark.parametrize("module", list(IMPORT_BUDGETS))
+def test_import_is_lazy(module):
+    code = (
+        f"import sys, {module}\n"
+        f"print(sorted(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    )
+    heavy = run_fresh("-c", code).stdout.strip()
+    assert heavy == "[]", f"{module} imports {heavy}"